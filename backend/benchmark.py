@@ -0,0 +1,181 @@
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CompiledProfile
+from mergedbase import MergedBase
+from resolution import Resolution
+from simulation import Simulation
+
+"""
+Measures the accuracy and latency of the pipeline on a labelled corpus of bloodweb screenshots, so that changes to
+functions.py, matcher.py and optimiser.py can be compared across commits.
+
+Corpus layout (as in main_test.py): <corpus>/<width>x<height>_<ui scale>/<name>.png, each a capture of the bloodweb
+region at that resolution. Each screenshot is labelled by <name>.json alongside it:
+{
+    "character": "nurse",                            (optional, default survivor)
+    "images": ["<name>.png", "<name>_1.png"],         (optional, several images of the same bloodweb for lines)
+    "nodes": {"1": "iconPerks_x_survivor", "7": "CLAIMED"},   (circle number from Resolution.circles -> unique id)
+    "edges": [[0, 1], [1, 7]]                        (pairs of circle numbers; 0 is the origin)
+}
+Unlabelled screenshots are only timed.
+
+usage: python backend/benchmark.py <corpus> [output json (default: benchmark.json)] [profile (default: blank)]
+                                   [edge detection: hough or sampled (default: hough)]
+"""
+
+def percentiles(values):
+    if len(values) == 0:
+        return None
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(max(values)),
+    }
+
+def precision_recall(counts):
+    tp, fp, fn = counts["tp"], counts["fp"], counts["fn"]
+    return {
+        "precision": tp / (tp + fp) if tp + fp > 0 else None,
+        "recall": tp / (tp + fn) if tp + fn > 0 else None,
+        **counts,
+    }
+
+def circle_numbers(sim):
+    """
+    :return: dict of each detected circle -> its circle number (0 for the origin)
+    """
+    relative = sim.res.circles()
+    numbers = {}
+    for circle in sim.circles:
+        if circle.is_origin:
+            numbers[circle] = 0
+            continue
+        dx, dy = circle.x() - sim.origin.x(), circle.y() - sim.origin.y()
+        numbers[circle] = min(relative, key=lambda num: (relative[num].x - dx) ** 2 + (relative[num].y - dy) ** 2)
+    return numbers
+
+def score(sim, labels, counts):
+    numbers = circle_numbers(sim)
+
+    # circles: was a node detected in each position
+    detected = {numbers[circle]: circle.unique_id for circle in sim.circles if not circle.is_origin}
+    expected = {int(num): unique_id for num, unique_id in labels.get("nodes", {}).items()}
+    counts["circles"]["tp"] += len(detected.keys() & expected.keys())
+    counts["circles"]["fp"] += len(detected.keys() - expected.keys())
+    counts["circles"]["fn"] += len(expected.keys() - detected.keys())
+
+    # icons: was each unclaimed node identified as the correct unlockable
+    detected_icons = {(num, unique_id) for num, unique_id in detected.items() if unique_id != "CLAIMED"}
+    expected_icons = {(num, unique_id) for num, unique_id in expected.items() if unique_id != "CLAIMED"}
+    counts["icons"]["tp"] += len(detected_icons & expected_icons)
+    counts["icons"]["fp"] += len(detected_icons - expected_icons)
+    counts["icons"]["fn"] += len(expected_icons - detected_icons)
+
+    # edges
+    detected_edges = {frozenset((numbers[sim.circles[c.index1]], numbers[sim.circles[c.index2]]))
+                      for c in sim.connections}
+    expected_edges = {frozenset(edge) for edge in labels.get("edges", [])}
+    counts["edges"]["tp"] += len(detected_edges & expected_edges)
+    counts["edges"]["fp"] += len(detected_edges - expected_edges)
+    counts["edges"]["fn"] += len(expected_edges - detected_edges)
+
+def new_group():
+    return {
+        "images": 0,
+        "labelled": 0,
+        "counts": {metric: {"tp": 0, "fp": 0, "fn": 0} for metric in ["circles", "icons", "edges"]},
+        "timings": {},
+        "peak_memory": 0,
+    }
+
+def summarise(group):
+    return {
+        "images": group["images"],
+        "labelled": group["labelled"],
+        **{metric: precision_recall(counts) for metric, counts in group["counts"].items()},
+        "latency": {stage: percentiles(timings) for stage, timings in group["timings"].items()},
+        "peak_memory_mb": group["peak_memory"] / 1024 / 1024,
+    }
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+if __name__ == "__main__":
+    corpus = sys.argv[1]
+    output = sys.argv[2] if len(sys.argv) > 2 else "benchmark.json"
+    profile = CompiledProfile.get(sys.argv[3] if len(sys.argv) > 3 else "blank")
+    edge_detection = sys.argv[4] if len(sys.argv) > 4 else "hough"
+
+    merged_bases = {} # (resolution, character) -> MergedBase
+    groups = {}
+    overall = new_group()
+    tracemalloc.start()
+    for res_dir in sorted(os.listdir(corpus)):
+        try:
+            width, rest = res_dir.split("x")
+            height, ui_scale = rest.split("_")
+            base_res = Resolution(int(width), int(height), int(ui_scale))
+        except ValueError:
+            continue
+
+        all_labels = {}
+        for file in os.listdir(os.path.join(corpus, res_dir)):
+            if file.endswith(".json"):
+                with open(os.path.join(corpus, res_dir, file)) as f:
+                    all_labels[f"{os.path.splitext(file)[0]}.png"] = json.load(f)
+        # additional images of a screenshot are run along with it, not on their own
+        additional = {f for labels in all_labels.values() for f in labels.get("images", [])[1:]}
+
+        group = groups.setdefault(res_dir, new_group())
+        for file in sorted(os.listdir(os.path.join(corpus, res_dir))):
+            if not file.endswith(".png") or file in additional:
+                continue
+
+            labels = all_labels.get(file)
+            image_files = labels.get("images", [file]) if labels is not None else [file]
+            cv_images, resolution = Simulation.load([os.path.join(corpus, res_dir, f) for f in image_files], base_res)
+
+            character = labels.get("character") if labels is not None else None
+            key = (resolution.width, resolution.height, resolution.ui_scale, character)
+            if key not in merged_bases:
+                merged_bases[key] = MergedBase(resolution, character)
+
+            tracemalloc.reset_peak()
+            sim = Simulation(cv_images, resolution, merged_bases[key], run_optimiser=True, profile=profile,
+                             edge_detection=edge_detection)
+            sim.run()
+            _, peak = tracemalloc.get_traced_memory()
+
+            for g in [group, overall]:
+                g["images"] += 1
+                g["peak_memory"] = max(g["peak_memory"], peak)
+                for stage, duration in sim.timings.items():
+                    g["timings"].setdefault(stage, []).append(duration)
+                if labels is not None:
+                    g["labelled"] += 1
+                    score(sim, labels, g["counts"])
+            print(f"{res_dir}/{file}: {sim.num_circles} circles, {len(sim.connections)} connections")
+    tracemalloc.stop()
+
+    results = {
+        "commit": commit(),
+        "corpus": corpus,
+        "edge_detection": edge_detection,
+        "resolutions": {res_dir: summarise(group) for res_dir, group in groups.items()},
+        "overall": summarise(overall),
+    }
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(json.dumps(results["overall"], indent=4))
\ No newline at end of file
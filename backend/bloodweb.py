@@ -0,0 +1,128 @@
+import networkx as nx
+import numpy as np
+
+from node import Node
+
+
+class Bloodweb:
+    """
+    A bloodweb as a fixed table of node slots: the state of slot i is element i of each array, and bit j of
+    adjacency[i] is set if slot i is joined to slot j. Nodes consumed by the entity are removed by clearing is_present
+    and their edges, so slots keep their index for the whole level.
+
+    Only Debugger and NetworkUtil need a networkx graph (see to_networkx); everything else uses the arrays.
+    """
+    max_slots = 64 # one bit per slot in adjacency
+
+    def __init__(self, node_ids, names, positions, is_accessible, is_user_claimed, values=None):
+        """
+        :param node_ids: id of each slot: "ORIGIN" or (circle number)_(unique_id)
+        :param names: unique_id of each slot
+        :param positions: (x, y) of each slot
+        :param values: value of each slot (default: 9999 for all)
+        """
+        if len(node_ids) > Bloodweb.max_slots:
+            raise ValueError(f"bloodweb of {len(node_ids)} nodes exceeds {Bloodweb.max_slots}")
+
+        self.node_ids = list(node_ids)
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+
+        # each distinct name once; name_index[i] is the position in names of slot i's name
+        self.names = list(dict.fromkeys(names))
+        name_index = {name: i for i, name in enumerate(self.names)}
+        self.name_index = np.array([name_index[name] for name in names], dtype=np.int32)
+
+        self.value = np.full(len(node_ids), 9999, dtype=np.int64) if values is None \
+            else np.array(values, dtype=np.int64)
+        self.is_accessible = np.array(is_accessible, dtype=bool).reshape(-1)
+        self.is_user_claimed = np.array(is_user_claimed, dtype=bool).reshape(-1)
+        self.is_present = np.ones(len(node_ids), dtype=bool)
+        self.x = np.array([x for x, _ in positions], dtype=np.int32).reshape(-1)
+        self.y = np.array([y for _, y in positions], dtype=np.int32).reshape(-1)
+        self.adjacency = np.zeros(len(node_ids), dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @staticmethod
+    def __bit(i):
+        return np.uint64(1) << np.uint64(i)
+
+    def add_edge(self, i, j):
+        self.adjacency[i] |= Bloodweb.__bit(j)
+        self.adjacency[j] |= Bloodweb.__bit(i)
+
+    def adjacency_matrix(self):
+        """
+        :return: (slots, slots) bool array, True where two slots are joined
+        """
+        bits = np.arange(len(self), dtype=np.uint64)
+        return ((self.adjacency[:, np.newaxis] >> bits) & np.uint64(1)).astype(bool)
+
+    def neighbours(self, i):
+        return np.flatnonzero((self.adjacency[i] >> np.arange(len(self), dtype=np.uint64)) & np.uint64(1))
+
+    def edges(self):
+        """
+        :return: list of (i, j), i < j, for each pair of joined slots
+        """
+        return [(i, j) for i, j in zip(*np.nonzero(np.triu(self.adjacency_matrix())))]
+
+    def present(self):
+        return np.flatnonzero(self.is_present)
+
+    def unclaimed(self):
+        return np.flatnonzero(self.is_present & ~self.is_user_claimed)
+
+    def name(self, i):
+        return self.names[self.name_index[i]]
+
+    def node(self, i) -> Node:
+        return Node(self.node_ids[i], self.name(i), int(self.value[i]), (int(self.x[i]), int(self.y[i])),
+                    bool(self.is_accessible[i]), bool(self.is_user_claimed[i]))
+
+    def set_state(self, i, is_accessible, is_user_claimed):
+        self.is_accessible[i] = is_accessible
+        self.is_user_claimed[i] = is_user_claimed
+
+    def claim(self, i):
+        self.is_user_claimed[i] = True
+        self.value[i] = 9999
+
+    def remove(self, i):
+        self.is_present[i] = False
+        self.adjacency[i] = 0
+        self.adjacency &= ~Bloodweb.__bit(i)
+
+    def correct_accessibility(self):
+        """
+        Makes every node joined to a claimed node accessible.
+
+        :return: slots that were corrected
+        """
+        claimed = np.bitwise_or.reduce(np.where(self.is_present & self.is_user_claimed,
+                                                np.uint64(1) << np.arange(len(self), dtype=np.uint64),
+                                                np.uint64(0)))
+        corrected = np.flatnonzero(self.is_present & ~self.is_accessible & ((self.adjacency & claimed) != 0))
+        self.is_accessible[corrected] = True
+        return corrected
+
+    def copy(self):
+        bloodweb = Bloodweb.__new__(Bloodweb)
+        bloodweb.node_ids = self.node_ids # ids and names are never modified
+        bloodweb.index = self.index
+        bloodweb.names = self.names
+        bloodweb.name_index = self.name_index
+        for attribute in ["value", "is_accessible", "is_user_claimed", "is_present", "x", "y", "adjacency"]:
+            setattr(bloodweb, attribute, getattr(self, attribute).copy())
+        return bloodweb
+
+    def to_networkx(self):
+        """
+        :return: networkx graph of the present nodes, with their data (including pyvis display attributes) as from
+                 Node.get_tuple
+        """
+        graph = nx.Graph()
+        graph.add_nodes_from([self.node(i).get_tuple() for i in self.present()])
+        graph.add_edges_from([(self.node_ids[i], self.node_ids[j]) for i, j in self.edges()])
+        return graph
\ No newline at end of file
@@ -8,6 +8,9 @@ from resolution import Resolution
 
 
 class Config:
+    edge_detections = ["hough", "sampled"] # see match_lines
+    png_compressions = [None] + list(range(10)) # see OutputWriter
+
     def __init__(self):
         if not os.path.isfile("config.json"):
             copyfile("assets/default_config.json", "config.json")
@@ -15,7 +18,9 @@ class Config:
         with open("config.json") as f:
             self.config = dict(json.load(f))
 
-        # ensure all parameters are legal
+        # ensure all parameters are legal: every missing one is copied from the default config before committing, as
+        # commit_changes writes all of them
+        self.defaults_copied = False
         if "resolution" not in self.config.keys():
             self.copy_from_default("resolution")
         if any([prop not in self.config["resolution"].keys() for prop in ["width", "height", "ui_scale"]]):
@@ -27,9 +32,18 @@ class Config:
         if "hotkey" not in self.config.keys():
             self.copy_from_default("hotkey")
 
+        if self.config.get("edge_detection") not in Config.edge_detections:
+            self.copy_from_default("edge_detection")
+
+        if self.config.get("png_compression", "") not in Config.png_compressions: # None is a legal value
+            self.copy_from_default("png_compression")
+
         if "profiles" not in self.config.keys():
             self.copy_from_default("profiles")
 
+        if self.defaults_copied:
+            self.commit_changes()
+
         # TODO set the value instead of raising error
         ids = []
         for num, profile in enumerate(self.config["profiles"], 1):
@@ -52,10 +66,13 @@ class Config:
                                           f"in config.json")
 
     def copy_from_default(self, prop):
+        """
+        Sets prop to its default value, without committing it.
+        """
         with open("assets/default_config.json") as f:
             default_config = dict(json.load(f))
         self.config[prop] = default_config[prop]
-        self.commit_changes()
+        self.defaults_copied = True
 
     def resolution(self):
         return Resolution(self.config["resolution"]["width"],
@@ -71,6 +88,12 @@ class Config:
     def hotkey(self):
         return self.config["hotkey"].split(" ")
 
+    def edge_detection(self):
+        return self.config["edge_detection"]
+
+    def png_compression(self):
+        return self.config["png_compression"]
+
     def __profiles(self):
         return self.config["profiles"]
 
@@ -83,6 +106,11 @@ class Config:
         p = self.get_profile_by_id(profile_id).get(unlockable_id, {})
         return p.get("tier", 0), p.get("subtier", 0)
 
+    def compile_profile(self, profile_id):
+        if profile_id == "blank":
+            return CompiledProfile(profile_id, {})
+        return CompiledProfile(profile_id, self.get_profile_by_id(profile_id))
+
     def profile_names(self):
         return [profile["id"] for profile in self.__profiles()]
 
@@ -92,6 +120,8 @@ class Config:
                 "resolution": self.config["resolution"],
                 "path": self.config["path"],
                 "hotkey": self.config["hotkey"],
+                "edge_detection": self.config["edge_detection"],
+                "png_compression": self.config["png_compression"],
                 "profiles": self.config["profiles"],
             }, output, indent=4) # to preserve order
 
@@ -135,4 +165,31 @@ class Config:
     def delete_profile(self, profile_id):
         to_be_removed = [profile for profile in self.__profiles() if profile["id"] == profile_id].pop(0)
         self.config["profiles"].remove(to_be_removed)
-        self.commit_changes()
\ No newline at end of file
+        self.commit_changes()
+
+class CompiledProfile:
+    """
+    A profile flattened into a lookup table of unique_id -> (tier, subtier), for reading preferences in the
+    optimiser without any file access. Use CompiledProfile.get to reuse the table until config.json is modified.
+    """
+    __cache = {} # profile id -> (config.json modification time, compiled profile)
+
+    def __init__(self, profile_id, profile):
+        self.profile_id = profile_id
+        self.preferences = {unique_id: (v.get("tier", 0), v.get("subtier", 0))
+                            for unique_id, v in profile.items() if unique_id != "id"}
+
+    def preference(self, unique_id):
+        return self.preferences.get(unique_id, (0, 0))
+
+    @staticmethod
+    def get(profile_id):
+        # read the modification time before the file, so that a concurrent save is never mistaken as compiled
+        mtime = os.stat("config.json").st_mtime_ns if os.path.isfile("config.json") else None
+        cached = CompiledProfile.__cache.get(profile_id)
+        if cached is not None and mtime is not None and cached[0] == mtime:
+            return cached[1]
+
+        compiled = Config().compile_profile(profile_id)
+        CompiledProfile.__cache[profile_id] = (mtime, compiled)
+        return compiled
\ No newline at end of file
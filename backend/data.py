@@ -1,3 +1,4 @@
+import json
 import os
 import sqlite3
 
@@ -37,25 +38,68 @@ class Data:
     __connection.close()
     print("disconnected from database")
 
+    __unlockables = {} # icon folder -> resolved unlockables, memoized per process
+
+    @staticmethod
+    def __build_icon_index(path):
+        """
+        :return: (modification time of every directory under path, dict of file name without extension -> list of
+                 [subdir, file] in the order they are found by os.walk)
+        """
+        dirs = {}
+        index = {}
+        for subdir, _, files in os.walk(path):
+            dirs[subdir] = os.stat(subdir).st_mtime_ns
+            for file in files:
+                index.setdefault(os.path.splitext(file)[0], []).append([subdir, file])
+        return dirs, index
+
+    @staticmethod
+    def __get_icon_index(path):
+        """
+        The index is persisted alongside the modification time of each directory it covers, and is only rebuilt when
+        a file or folder is added to, removed from or renamed in one of them.
+        """
+        try:
+            with open(Path.cache_icon_index) as f:
+                cached = json.load(f)
+            if cached["path"] == path and all(os.stat(subdir).st_mtime_ns == mtime
+                                              for subdir, mtime in cached["dirs"].items()):
+                return cached["index"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        dirs, index = Data.__build_icon_index(path)
+        try:
+            os.makedirs(Path.cache, exist_ok=True)
+            with open(Path.cache_icon_index, "w") as output:
+                json.dump({"path": path, "dirs": dirs, "index": index}, output)
+        except OSError:
+            print(f"could not write icon index {Path.cache_icon_index}")
+        return index
+
     @staticmethod
     def get_unlockables():
-        all_files = [(subdir, file) for subdir, dirs, files in os.walk(Config().path()) for file in files]
+        path = Config().path()
+        if path in Data.__unlockables:
+            return list(Data.__unlockables[path])
+
+        index = Data.__get_icon_index(path)
         unlockables = []
         for row in Data.__unlockables_rows:
             u_id, u_name, u_category, u_rarity, u_notes, u_type = row
 
             # search in user's folder
             u_image_path = None
-            for subdir, file in all_files:
-                if u_id in file:
-                    # bubba and hillbilly share an addon with the same name
-                    if u_category == "bubba" and u_id == "iconAddon_speedLimiter" and "Xipre" in subdir:
-                        continue
-                    elif u_category == "hillbilly" and u_id == "iconAddon_speedLimiter" and "Xipre" not in subdir:
-                        continue
+            for subdir, file in index.get(u_id, []):
+                # bubba and hillbilly share an addon with the same name
+                if u_category == "bubba" and u_id == "iconAddon_speedLimiter" and "Xipre" in subdir:
+                    continue
+                elif u_category == "hillbilly" and u_id == "iconAddon_speedLimiter" and "Xipre" not in subdir:
+                    continue
 
-                    u_image_path = os.path.normpath(os.path.join(subdir, file))
-                    break
+                u_image_path = os.path.normpath(os.path.join(subdir, file))
+                break
 
             # search in asset folder
             if u_image_path is None:
@@ -69,7 +113,8 @@ class Data:
             if u_image_path is not None:
                 unlockables.append(Unlockable(u_id, u_name, u_category, u_rarity, u_notes, u_type, u_image_path))
 
-        return unlockables
+        Data.__unlockables[path] = unlockables
+        return list(unlockables)
 
     @staticmethod
     def get_killers(sort):
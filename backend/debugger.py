@@ -1,4 +1,7 @@
+import cProfile
+import json
 import os
+import pstats
 
 import cv2
 
@@ -9,9 +12,15 @@ from utils.network_util import NetworkUtil
 
 
 class Debugger:
-    def __init__(self, cv_images: [CVImage], timestamp, i, write_to_output=False):
-        self.cv_images = cv_images
+    __atlases = set() # cache keys of the atlases written to output/atlas in this process
+
+    def __init__(self, cv_images: [CVImage], timestamp, i, write_to_output=False, writer=None):
+        """
+        :param writer: OutputWriter to write output in the background with (default: written before returning)
+        """
+        self.cv_images = []
         self.write_to_output = write_to_output
+        self.writer = writer
 
         self.i = i
         self.time = timestamp.strftime("%d-%m-%y %H-%M-%S")
@@ -29,13 +38,53 @@ class Debugger:
                 os.mkdir(f"output/{self.time}")
             if not os.path.isdir(f"output/{self.time}/{i}"):
                 os.mkdir(f"output/{self.time}/{i}")
-            for j in range(len(self.cv_images)):
-                cv2.imwrite(f"output/{self.time}/{i}/initial_image_{j}.png", self.cv_images[j].get_bgr())
+        for cv_image in cv_images:
+            self.add_initial_image(cv_image)
+
+    def __write_image(self, path, image):
+        if self.writer is not None:
+            self.writer.write_image(path, image)
+        else:
+            cv2.imwrite(path, image)
+
+    def __write_html(self, bloodweb, file_name):
+        if self.writer is not None:
+            self.writer.write_html(bloodweb, file_name)
+        else:
+            NetworkUtil.write_to_html(bloodweb, file_name)
+
+    def __write_text(self, path, text):
+        if self.writer is not None:
+            self.writer.write_text(path, text)
+        else:
+            with open(path, "w") as file:
+                file.write(text)
+
+    # screen capture
+    def add_initial_image(self, cv_image):
+        if self.write_to_output:
+            self.__write_image(f"output/{self.time}/{self.i}/initial_image_{len(self.cv_images)}.png",
+                               cv_image.get_bgr())
+        self.cv_images.append(cv_image)
+        return self
 
-    # merger
+    # merger: written once per atlas (by its cache key) in output/atlas, which each run refers to in atlas.json
     def set_merger(self, merger):
         if self.write_to_output:
-            cv2.imwrite(f"output/{self.time}/collage.png", merger.images)
+            directory = f"output/atlas/{merger.key}"
+            if merger.key not in Debugger.__atlases and not os.path.isfile(f"{directory}/index.json"):
+                os.makedirs(directory, exist_ok=True)
+                chunks = merger.chunks()
+                for n, (_, chunk) in enumerate(chunks):
+                    self.__write_image(f"{directory}/chunk_{n}.png", chunk)
+                # written after the chunks, so that an atlas with an index is complete
+                self.__write_text(f"{directory}/index.json",
+                                  json.dumps({"full_dim": merger.full_dim,
+                                             "columns": chunks[0][1].shape[1] // merger.full_dim if chunks else 0,
+                                             "chunks": [names for names, _ in chunks]}))
+            Debugger.__atlases.add(merger.key)
+            self.__write_text(f"output/{self.time}/atlas.json",
+                              json.dumps({"key": merger.key, "path": f"../atlas/{merger.key}"}))
         return self
 
     # match origin
@@ -61,7 +110,7 @@ class Debugger:
         self.edge_images = edge_images
         if self.write_to_output:
             for index, edge_image in enumerate(self.edge_images):
-                cv2.imwrite(f"output/{self.time}/{self.i}/edges_{index}.png", edge_image)
+                self.__write_image(f"output/{self.time}/{self.i}/edges_{index}.png", edge_image)
 
     def set_raw_lines(self, all_raw_lines):
         for i, raw_lines in enumerate(all_raw_lines):
@@ -75,19 +124,29 @@ class Debugger:
     # grapher
     def set_base_bloodweb(self, base_bloodweb):
         if self.write_to_output:
-            NetworkUtil.write_to_html(base_bloodweb, f"output/{self.time}/{self.i}/base_bloodweb")
+            self.__write_html(base_bloodweb, f"output/{self.time}/{self.i}/base_bloodweb")
         return self
 
     # optimiser
     def set_dijkstra(self, dijkstra_graph, j):
         if self.write_to_output:
-            NetworkUtil.write_to_html(dijkstra_graph, f"output/{self.time}/{self.i}/dijkstra_{j}")
+            self.__write_html(dijkstra_graph, f"output/{self.time}/{self.i}/dijkstra_{j}")
         return self
 
     # updated image
     def add_updated_image(self, updated_image, j):
         if self.write_to_output:
-            cv2.imwrite(f"output/{self.time}/{self.i}/updated_image_{j}.png", updated_image)
+            self.__write_image(f"output/{self.time}/{self.i}/updated_image_{j}.png", updated_image)
+        return self
+
+    # profile of the whole level (see StateProcess), written whether or not write_to_output is on
+    def set_profile(self, profile: cProfile.Profile):
+        directory = f"output/{self.time}/{self.i}"
+        os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(f"{directory}/profile.prof") # e.g. python -m pstats, or snakeviz for a flame graph
+        with open(f"{directory}/profile.txt", "w") as file:
+            pstats.Stats(profile, stream=file).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+        print(f"profile written to {directory}/profile.prof")
         return self
 
     def show_images(self):
@@ -112,7 +171,7 @@ class Debugger:
                     cv2.line(raw_output, (x1, y1), (x2, y2), 255, 2)
 
             if self.write_to_output:
-                cv2.imwrite(f"output/{self.time}/{self.i}/raw_output_{i}.png", raw_output)
+                self.__write_image(f"output/{self.time}/{self.i}/raw_output_{i}.png", raw_output)
 
             cv2.imshow("unfiltered raw output (r-adjusted)", raw_output)
             if len(self.edge_images) > i:
@@ -130,8 +189,8 @@ class Debugger:
             cv2.circle(validated_output, (x, y), r, 255, 2)
             cv2.rectangle(validated_output, (x - 5, y - 5), (x + 5, y + 5), 255, -1)
         for connection in self.connections:
-            cv2.line(validated_output, (connection.circle1.x(), connection.circle1.y()),
-                     (connection.circle2.x(), connection.circle2.y()), 255, 1)
+            cv2.line(validated_output, self.valid_circles[connection.index1].xy(),
+                     self.valid_circles[connection.index2].xy(), 255, 1)
         cv2.imshow("validated & processed output (r-adjusted)", validated_output)
         cv2.waitKey(0)
 
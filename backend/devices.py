@@ -0,0 +1,145 @@
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from exceptions import ReplayFinished
+
+"""
+Capture backends (where images of the bloodweb come from) and input backends (where clicks go to). The live backends
+use the screen and mouse via pyautogui; the replay and stub backends allow the whole pipeline to run offline on
+images recorded by Debugger, without the game or a display.
+
+pyautogui is imported lazily so that offline runs do not need a display.
+"""
+
+class LiveCapture:
+    realtime = True # whether images change with time (and so are worth waiting between)
+
+    def start_level(self):
+        pass
+
+    def screenshot(self, region):
+        """
+        :param region: (x, y, width, height)
+        :return: BGR image of the region
+        """
+        import pyautogui
+        return np.array(pyautogui.screenshot(region=region))[:, :, :: -1].copy()
+
+class ReplayCapture:
+    """
+    Serves images recorded by Debugger instead of the screen, from either a run folder (output/<time>, containing a
+    folder for each level) or a single folder of images. Each level's initial images are served first, then its
+    updated images in the order they were taken; the last image is repeated if a level runs out.
+    """
+    realtime = False
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.levels = ReplayCapture.recorded_levels(directory)
+        self.level = -1
+        self.index = 0
+        self.level_times = [] # perf_counter at the start of each level, for benchmarking
+
+    @staticmethod
+    def __numbered(files, prefix):
+        pattern = re.compile(rf"{prefix}_(\d+)\.png")
+        matches = [(int(match.group(1)), file) for file in files for match in [pattern.fullmatch(file)] if match]
+        return [file for _, file in sorted(matches)]
+
+    @staticmethod
+    def recorded_levels(directory):
+        """
+        :return: list of levels, each a list of image paths in the order they were taken
+        """
+        level_dirs = sorted([d for d in os.listdir(directory)
+                             if d.isdigit() and os.path.isdir(os.path.join(directory, d))], key=int)
+        if len(level_dirs) == 0:
+            files = sorted(file for file in os.listdir(directory) if file.endswith(".png"))
+            return [[os.path.join(directory, file)] for file in files]
+
+        levels = []
+        for level_dir in level_dirs:
+            files = os.listdir(os.path.join(directory, level_dir))
+            ordered = ReplayCapture.__numbered(files, "initial_image") + ReplayCapture.__numbered(files, "updated_image")
+            if len(ordered) > 0:
+                levels.append([os.path.join(directory, level_dir, file) for file in ordered])
+        return levels
+
+    def start_level(self):
+        self.level += 1
+        self.index = 0
+        if self.level >= len(self.levels):
+            raise ReplayFinished(f"Replayed all {len(self.levels)} levels from {self.directory}")
+        self.level_times.append(time.perf_counter())
+
+    def screenshot(self, region):
+        paths = self.levels[max(self.level, 0)]
+        path = paths[min(self.index, len(paths) - 1)]
+        self.index += 1
+        return cv2.imread(path, cv2.IMREAD_COLOR)
+
+class LiveInput:
+    def __init__(self):
+        import pyautogui
+        pyautogui.FAILSAFE = False
+
+    def move_to(self, x, y):
+        import pyautogui
+        pyautogui.moveTo(x, y)
+
+    def mouse_down(self):
+        import pyautogui
+        pyautogui.mouseDown()
+
+    def mouse_up(self):
+        import pyautogui
+        pyautogui.mouseUp()
+
+    def click(self):
+        import pyautogui
+        pyautogui.click()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class StubInput:
+    """
+    Records inputs instead of sending them, and does not wait for the game to respond to them.
+    """
+    def __init__(self):
+        self.actions = [] # (perf_counter, action, args)
+
+    def __record(self, action, *args):
+        self.actions.append((time.perf_counter(), action, args))
+
+    def move_to(self, x, y):
+        self.__record("move_to", x, y)
+
+    def mouse_down(self):
+        self.__record("mouse_down")
+
+    def mouse_up(self):
+        self.__record("mouse_up")
+
+    def click(self):
+        self.__record("click")
+
+    def sleep(self, seconds):
+        pass
+
+    def selections(self):
+        """
+        :return: perf_counter and position of each node held down
+        """
+        selections = []
+        position = None
+        for timestamp, action, args in self.actions:
+            if action == "move_to":
+                position = args
+            elif action == "mouse_down":
+                selections.append((timestamp, position))
+        return selections
\ No newline at end of file
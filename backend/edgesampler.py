@@ -0,0 +1,103 @@
+import numpy as np
+
+from resolution import Resolution
+from resolutionprofile import ResolutionProfile
+from shapes import Connection, Position
+
+
+class EdgeSampler:
+    """
+    Detects edges without searching for lines: nodes can only be in the positions of Resolution.circles, so the
+    segments an edge can lie along are known in advance. The pixels along each of them are sampled from the edge image
+    (as from edge_image) in one gather per image, and a segment is an edge if enough of them are on an edge.
+    """
+    max_length = 400 # longest possible edge at 4K: neighbouring slots are up to 373 apart, the next nearest 420
+    samples = 32 # points sampled along each segment
+    half_width = 8 # pixels sampled either side of each point, perpendicular to the segment, at 4K
+    threshold = 0.6 # fraction of points with an edge pixel beside them (over all images) for a segment to be an edge
+
+    __samplers = {} # (width, height, ui_scale) -> EdgeSampler
+
+    def __init__(self, res: Resolution):
+        """
+        Precomputes the sample coordinates (relative to the origin) along every possible edge at res.
+        """
+        profile = ResolutionProfile.get(res)
+        ratio = profile.ratio
+        self.relative = [Position(0, 0)] + list(profile.circles.values()) # slot 0 is the origin
+        positions = np.vstack([[0, 0], profile.positions]).astype(np.float64)
+
+        # where edges are drawn out of the edge image around each node (as in detect_lines), for the largest node
+        clearance = profile.outer_radii[profile.large_node_inner_radius]
+
+        pairs = []
+        for a in range(len(positions)):
+            for b in range(a + 1, len(positions)):
+                if np.linalg.norm(positions[b] - positions[a]) > EdgeSampler.max_length * ratio:
+                    continue
+                # an edge can't pass through another node
+                others = np.delete(positions, [a, b], axis=0)
+                if not np.any(EdgeSampler.__distance_to_segment(others, positions[a], positions[b]) < clearance):
+                    pairs.append((a, b))
+        self.pairs = np.array(pairs, np.int32) # (edges, 2) slots
+
+        # points along the part of each segment outside both nodes, each with a line of points across the segment
+        start, end = positions[self.pairs[:, 0]], positions[self.pairs[:, 1]] # (edges, 2)
+        length = np.linalg.norm(end - start, axis=1, keepdims=True)
+        direction = (end - start) / length
+        normal = direction[:, ::-1] * [1, -1]
+        along = np.linspace(0, 1, EdgeSampler.samples)[np.newaxis, :, np.newaxis] # (1, samples, 1)
+        along = clearance + along * (length[:, np.newaxis] - 2 * clearance) # (edges, samples, 1)
+        half_width = max(1, round(EdgeSampler.half_width * ratio))
+        across = np.arange(-half_width, half_width + 1)[np.newaxis, np.newaxis, :, np.newaxis] # (1, 1, width, 1)
+        points = start[:, np.newaxis, np.newaxis] + (along * direction[:, np.newaxis])[:, :, np.newaxis] + \
+            across * normal[:, np.newaxis, np.newaxis] # (edges, samples, width, 2)
+        self.points = np.round(points).astype(np.int32)
+
+    @staticmethod
+    def get(res: Resolution):
+        """
+        :return: the EdgeSampler for res, which is only built the first time
+        """
+        key = (res.width, res.height, res.ui_scale)
+        if key not in EdgeSampler.__samplers:
+            EdgeSampler.__samplers[key] = EdgeSampler(res)
+        return EdgeSampler.__samplers[key]
+
+    @staticmethod
+    def __distance_to_segment(points, start, end):
+        """
+        :return: distance from each of points (n, 2) to the segment from start to end
+        """
+        t = np.clip((points - start) @ (end - start) / np.dot(end - start, end - start), 0, 1)
+        return np.linalg.norm(points - (start + t[:, np.newaxis] * (end - start)), axis=1)
+
+    def scores(self, edges: np.ndarray, origin: Position, pairs=None):
+        """
+        :param edges: the edge image
+        :param pairs: indices of the pairs to score (default: all)
+        :return: for each pair, the fraction of its points with an edge pixel across the segment from them
+        """
+        points = self.points if pairs is None else self.points[pairs]
+        height, width = edges.shape
+        x = np.clip(points[..., 0] + origin.x, 0, width - 1)
+        y = np.clip(points[..., 1] + origin.y, 0, height - 1)
+        return (edges[y, x] > 0).any(axis=2).mean(axis=1)
+
+    def connections(self, edge_images: [np.ndarray], circles) -> [Connection]:
+        """
+        :param circles: the circles from vector_circles, the first being the origin
+        :return: the connections between circles whose segments score at least threshold over all the images
+        """
+        origin = circles[0].position
+        # slot i is at origin + self.relative[i], exactly where vector_circles puts its circle
+        slot_index = {origin.sum(position): i for i, position in enumerate(self.relative)}
+        circle_index = np.full(len(self.relative), -1)
+        for i, circle in enumerate(circles):
+            if circle.position in slot_index:
+                circle_index[slot_index[circle.position]] = i
+
+        pairs = np.flatnonzero((circle_index[self.pairs] >= 0).all(axis=1)) # segments between two nodes
+        scores = np.mean([self.scores(edges, origin, pairs) for edges in edge_images], axis=0)
+        joined = circle_index[self.pairs[pairs[scores >= EdgeSampler.threshold]]]
+        return [Connection(i, j) for i, j in joined.tolist()]
\ No newline at end of file
@@ -1,4 +1,14 @@
 class ConfigError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class ReplayFinished(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+class RunStopped(Exception):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
\ No newline at end of file
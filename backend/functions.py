@@ -1,65 +1,146 @@
 import math
-import os
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import nullcontext
 from datetime import datetime
+from queue import Queue
+from threading import Thread, Event
 from typing import Tuple
 
 import cv2
 import numpy as np
-import pyautogui
 
+from backend.edgesampler import EdgeSampler
 from backend.matcher import Matcher
-from backend.paths import Path
 from backend.resolution import Resolution
 from backend.shapes import Circle, Position, Line, Connection
 from cvimage import CVImage
 from image import Image
+from resolutionprofile import ResolutionProfile
 
 
-def screen_capture(base_res: Resolution, ratio, iterations=3, interval=0.5) -> [CVImage]:
+def grab_frame(base_res: Resolution, ratio, capture) -> CVImage:
     """
-    Takes several images with some intervening interval.
+    Takes a single image of the bloodweb.
 
     Args:
         base_res: the base display resolution
         ratio: the factor by which to downscale the base resolution for the final image (saves computation)
-        iterations: the number of images to take
-        interval: the number of seconds between each image
+        capture: the capture backend (see devices.py)
 
     Returns:
-        images: a list of images
+        image: the image
     """
 
     # get capture region
     x, y = base_res.top_left()
     width = height = base_res.cap_dim()
 
+    screenshot = capture.screenshot((x, y, width, height))
+
+    if ratio != 1:
+        new_height, new_width = round(height / ratio), round(width / ratio)
+        screenshot = cv2.resize(screenshot, (new_width, new_height), interpolation=Image.interpolation)
+
+    return CVImage(screenshot)
+
+def screen_capture(base_res: Resolution, ratio, capture, iterations=3, interval=0.5) -> [CVImage]:
+    """
+    Takes several images with some intervening interval.
+
+    Args:
+        base_res: the base display resolution
+        ratio: the factor by which to downscale the base resolution for the final image (saves computation)
+        capture: the capture backend (see devices.py)
+        iterations: the number of images to take
+        interval: the number of seconds between each image
+
+    Returns:
+        images: a list of images
+    """
+
     images = []
 
     previous = datetime.now()
     for i in range(iterations):
-        screenshot = pyautogui.screenshot(region=(x, y, width, height))
-        screenshot = np.array(screenshot)[:, :, :: -1].copy()
-
-        if ratio != 1:
-            height, width, layers = screenshot.shape
-            new_height, new_width = round(height / ratio), round(width / ratio)
-            screenshot = cv2.resize(screenshot, (new_width, new_height), interpolation=Image.interpolation)
+        images.append(grab_frame(base_res, ratio, capture))
 
-        images.append(CVImage(screenshot))
-
-        if i != iterations - 1:
+        if i != iterations - 1 and capture.realtime:
             time.sleep(max(interval - (datetime.now() - previous).total_seconds(), 0))
             previous = datetime.now()
     return images
 
-def match_origin(cv_image: CVImage, res: Resolution) -> Tuple[Circle, str, np.ndarray]:
+class FrameGrabber(Thread):
+    """
+    Takes the same images as screen_capture, but on a background thread which fills a bounded queue, so that the
+    first image can be analysed while the rest are still being taken. If on_frame is given, it is submitted to a
+    worker thread with each image as soon as that image is taken (e.g. to start edge detection early).
+    """
+    def __init__(self, base_res: Resolution, ratio, capture, iterations=3, interval=0.5, on_frame=None):
+        Thread.__init__(self)
+        self.daemon = True
+        self.base_res = base_res
+        self.ratio = ratio
+        self.capture = capture
+        self.iterations = iterations
+        self.interval = interval
+        self.on_frame = on_frame
+
+        self.frames = Queue(maxsize=iterations)
+        self.executor = ThreadPoolExecutor(max_workers=1) if on_frame is not None else None
+        self.stopped = Event()
+
+    def run(self):
+        previous = datetime.now()
+        try:
+            for i in range(self.iterations):
+                if self.stopped.is_set():
+                    return
+                cv_image = grab_frame(self.base_res, self.ratio, self.capture)
+                future = self.executor.submit(self.on_frame, cv_image) if self.executor is not None else None
+                self.frames.put((cv_image, future))
+
+                if i != self.iterations - 1 and self.capture.realtime:
+                    self.stopped.wait(max(self.interval - (datetime.now() - previous).total_seconds(), 0))
+                    previous = datetime.now()
+        except Exception as e:
+            # surface the error in the consuming thread instead of leaving it waiting forever
+            self.frames.put((e, None))
+
+    def next_frame(self) -> Tuple[CVImage, Future]:
+        """
+        Returns:
+            cv_image: the next image, blocking until it has been taken
+            future: the result of on_frame for this image (or None if on_frame was not given)
+        """
+        cv_image, future = self.frames.get()
+        if isinstance(cv_image, Exception):
+            raise cv_image
+        return cv_image, future
+
+    def stop(self):
+        """
+        Stops taking images and cancels the on_frame calls not yet started, then waits for the image being taken (if
+        any), so that nothing is left running alongside what comes next. An on_frame call already running is left to
+        finish in the background.
+        """
+        self.stopped.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.join()
+
+def match_origin(cv_image: CVImage, res: Resolution, previous_type=None) -> Tuple[Circle, str, np.ndarray]:
     """
     Finds the position and type of origin from the image.
 
     Args:
         cv_image:
         res:
+        previous_type: the origin type of the previous level, if any. It is matched first, and taken without matching
+                       the other types if it scores at least Matcher.origin_confidence. Basic black and red origins
+                       score alike, so the type may then stay as the previous one of the two, but never changes
+                       between basic and prestige.
 
     Returns:
         origin: the matched origin
@@ -74,17 +155,19 @@ def match_origin(cv_image: CVImage, res: Resolution) -> Tuple[Circle, str, np.nd
     cropped = image[round(height / crop_ratio):round((crop_ratio - 1) * height / crop_ratio),
                     round(width / crop_ratio):round((crop_ratio - 1) * width / crop_ratio)]
 
-    for subdir, dirs, files in os.walk(Path.assets_origins):
-        for file in files:  # origin_basic_black, origin_basic_red etc.
-            dim = res.origin_dim(file)
-            radius = round(dim / 2)
-            origin = cv2.split(cv2.imread(os.path.join(subdir, file), cv2.IMREAD_UNCHANGED))
-            template = cv2.resize(origin[2], (dim, dim), interpolation=Image.interpolation)
-            template_alpha = cv2.resize(origin[3], (dim, dim), interpolation=Image.interpolation) # for masking
-            result = cv2.matchTemplate(cropped, template, cv2.TM_CCOEFF_NORMED, mask=template_alpha)
+    # each template is located on the crop downscaled, then refined around there at full scale
+    scale = Matcher.origin_scale(res)
+    coarse = cv2.resize(cropped, (cropped.shape[1] // scale, cropped.shape[0] // scale),
+                        interpolation=cv2.INTER_AREA) if scale > 1 else cropped
 
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            matches.append((file, min_val, max_val, min_loc, max_loc, radius))
+    # the previous type first (sorted is stable, so the rest stay in order)
+    templates = sorted(Matcher.origin_templates(res), key=lambda origin: origin[0] != previous_type)
+    for file, template, template_alpha, radius, coarse_template, coarse_alpha in templates:
+        min_val, max_val, min_loc, max_loc = Matcher.match_coarse_to_fine(
+            cropped, coarse, scale, template, template_alpha, coarse_template, coarse_alpha)
+        matches.append((file, min_val, max_val, min_loc, max_loc, radius))
+        if file == previous_type and max_val >= Matcher.origin_confidence:
+            break
 
     origin_type, _, _, _, top_left, radius = max(matches, key=lambda match: match[2])
 
@@ -94,7 +177,8 @@ def match_origin(cv_image: CVImage, res: Resolution) -> Tuple[Circle, str, np.nd
     origin = Circle(centre, radius, "red", "ORIGIN", is_origin=True)
     return origin, origin_type, cropped
 
-def vector_circles(cv_image: CVImage, res: Resolution, origin: Circle, merged_base, debugger) -> [Circle]:
+def vector_circles(cv_image: CVImage, res: Resolution, origin: Circle, merged_base, debugger,
+                   timer=None) -> [Circle]:
     """
     Identifies circles using vectors and matches their icons, including the origin.
     (Feel free to remove the debugger parameter and just return the required information to be shown, then add it
@@ -106,31 +190,132 @@ def vector_circles(cv_image: CVImage, res: Resolution, origin: Circle, merged_ba
         origin:
         merged_base:
         debugger:
+        timer: StageTimer to time matching the icons with (as stage icons), if any
 
     Returns:
         circles
 
     """
     image_gray = cv_image.get_gray()
-    image_filtered = cv_image.get_gray()
-    image_filtered = cv2.convertScaleAbs(image_filtered, alpha=1.4, beta=0)
-    image_filtered = cv2.fastNlMeansDenoising(image_filtered, None, 3, 7, 21)
+    height, width = image_gray.shape
+    positions = [origin.position.sum(rel_position) for rel_position in ResolutionProfile.get(res).circles.values()]
+    positions = [position for position in positions if 0 <= position.x < width and 0 <= position.y < height]
+    squares = Matcher.filter_squares(image_gray, positions, res) # only where the circles can be
 
     circles = [origin]
 
-    for circle_num, rel_position in res.circles().items():
-        abs_position = origin.position.sum(rel_position)
-        r, color, match_unique_id = Matcher.get_circle_properties(debugger, image_gray, cv_image.get_bgr(),
-                                                                  image_filtered, merged_base, abs_position, res)
+    for abs_position, square in zip(positions, squares):
+        r, color, match_unique_id = Matcher.get_circle_properties(cv_image.get_bgr(), square, abs_position, res)
 
         if all(x is None for x in (r, color, match_unique_id)):
             continue
 
         circles.append(Circle(abs_position, r, color, match_unique_id))
 
+    # identify the unlockables of all unclaimed nodes in one go
+    if merged_base is not None:
+        unclaimed = [i for i, circle in enumerate(circles) if circle.unique_id is None]
+        with timer.stage("icons") if timer is not None else nullcontext():
+            matches = Matcher.match_unlockables(debugger, image_gray, [circles[i].position for i in unclaimed],
+                                                merged_base, res)
+        for i, (match_unique_id, score) in zip(unclaimed, matches):
+            circles[i] = circles[i]._replace(unique_id=match_unique_id)
+
     return circles
 
-def match_lines(cv_images: [CVImage], res, circles, threshold=30):
+def edge_image(cv_image: CVImage, res) -> np.ndarray:
+    """
+    Filters an image and detects its edges, ready for lines to be detected. Does not depend on the circles, so it can
+    be run on each image as soon as it is taken.
+
+    Args:
+        cv_image:
+        res:
+
+    Returns:
+        edges: the edge image
+    """
+    image_filtered = cv_image.get_red()
+    ratio = 3
+    image_filtered = cv2.bilateralFilter(image_filtered, ratio, 110, 110)
+    image_filtered = cv2.convertScaleAbs(image_filtered, alpha=1.3, beta=50)
+    profile = ResolutionProfile.get(res)
+    return cv2.Canny(image_filtered, profile.canny_min, profile.canny_max)
+
+def detect_lines(edges: np.ndarray, res, circles, threshold=30):
+    """
+    Detects lines in a single edge image and the connections they form between circles.
+
+    Args:
+        edges: the edge image from edge_image (the circles are drawn out of it in place)
+        res:
+        circles:
+        threshold:
+
+    Returns:
+        raw_lines: every line detected
+        connections: the distinct connections joining two circles, in the order they were first detected
+    """
+    profile = ResolutionProfile.get(res)
+    for circle in circles:
+        # remove the node's circle from the edges graph (reduces noise)
+        cv2.circle(edges, (circle.x(), circle.y()), profile.outer_radii[circle.radius], 0, thickness=-1)
+
+    line_length = profile.line_length
+    lines = cv2.HoughLinesP(edges, rho=1, theta=np.pi / 180, threshold=threshold,
+                            minLineLength=line_length, maxLineGap=line_length)
+    lines = lines.reshape(-1, 4) if lines is not None else np.empty((0, 4), np.int32)
+
+    output = [Line(Position(x1, y1), Position(x2, y2)) for x1, y1, x2, y2 in lines.tolist()]
+
+    # validate lines by removing those that do not join two circles; add the connected nodes to edge list
+    return output, line_connections(lines, circles, res)
+
+def line_connections(lines: np.ndarray, circles, res) -> [Connection]:
+    """
+    Finds the circles that each line joins, for all lines and circles at once. The first end of a line joins the
+    first circle (in the order of circles) whose centre it is close to, and the second end the first other circle
+    whose centre it is close to.
+
+    Args:
+        lines: (N, 4) array of the x1, y1, x2, y2 of each line, as from cv2.HoughLinesP
+        res:
+        circles:
+
+    Returns:
+        connections: the distinct connections joining two circles, in the order of the first line joining them
+    """
+    if len(lines) == 0 or len(circles) < 2:
+        return []
+
+    centres = np.array([circle.xy() for circle in circles], np.int64) # (M, 2)
+    ends = lines.reshape(-1, 2, 1, 2).astype(np.int64) # (N, end, 1, 2)
+    close = ((ends - centres) ** 2).sum(axis=3) < ResolutionProfile.get(res).endpoint_distance_sq # (N, end, M)
+
+    lines_range = np.arange(len(lines))
+    index1 = close[:, 0].argmax(axis=1) # first True, if any
+    joined = close[:, 0].any(axis=1)
+    close[lines_range, 1, index1] = False # the second end must join a different circle
+    index2 = close[:, 1].argmax(axis=1)
+    joined &= close[:, 1].any(axis=1)
+
+    connections = dict.fromkeys(Connection(i, j) for i, j in zip(index1[joined].tolist(), index2[joined].tolist()))
+    return list(connections)
+
+def validate_lines(all_connections: [[Connection]]) -> [Connection]:
+    """
+    Validates connections across multiple images: connections must exist in the majority of images to be valid.
+
+    Args:
+        all_connections: the connections from detect_lines for each image
+
+    Returns:
+        connections: the validated connections, in the order they were first detected
+    """
+    votes = Counter(connection for connections in all_connections for connection in connections)
+    return [connection for connection, count in votes.items() if count > math.floor(len(all_connections) / 2)]
+
+def match_lines(cv_images: [CVImage], res, circles, threshold=30, edge_detection="hough"):
     """
 
     Args:
@@ -138,54 +323,33 @@ def match_lines(cv_images: [CVImage], res, circles, threshold=30):
         res:
         circles:
         threshold:
+        edge_detection: "hough" to detect lines anywhere in each image and keep those joining circles in the majority
+                        of images, or "sampled" to only check where edges can be (see EdgeSampler)
 
     Returns:
+        edge_images: the edge image for each image
+        raw_lines: every line detected in each image (none if sampled)
+        connections: the validated connections
 
     """
-    edge_images = []
+    edge_images = [edge_image(cv_image, res) for cv_image in cv_images]
+    return (edge_images,) + lines_from_edges(edge_images, res, circles, threshold, edge_detection)
+
+def lines_from_edges(edge_images: [np.ndarray], res, circles, threshold=30, edge_detection="hough"):
+    """
+    The second half of match_lines, for edge images that have already been detected.
+
+    Returns:
+        raw_lines: every line detected in each image (none if sampled)
+        connections: the validated connections
+    """
+    if edge_detection == "sampled":
+        return [[] for _ in edge_images], EdgeSampler.get(res).connections(edge_images, circles)
+
     raw_lines = []
-    validated1_output = []
-    for i, cv_image in enumerate(cv_images):
-        image_filtered = cv_image.get_red()
-        ratio = 3
-        image_filtered = cv2.bilateralFilter(image_filtered, ratio, 110, 110)
-        image_filtered = cv2.convertScaleAbs(image_filtered, alpha=1.3, beta=50)
-        edges = cv2.Canny(image_filtered, res.canny_min(), res.canny_max())
-        edge_images.append(edges)
-
-        for circle in circles:
-            # remove the node's circle from the edges graph (reduces noise)
-            cv2.circle(edges, (circle.x(), circle.y()), circle.radius + Resolution.additional_radius(circle.radius),
-                       0, thickness=-1)
-
-        lines = cv2.HoughLinesP(edges, rho=1, theta=np.pi / 180, threshold=threshold,
-                                minLineLength=res.line_length(), maxLineGap=res.line_length())
-
-        output = []
-        if lines is not None:
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                output.append(Line(Position(x1, y1), Position(x2, y2)))
+    all_connections = []
+    for edges in edge_images:
+        output, connections = detect_lines(edges, res, circles, threshold)
         raw_lines.append(output)
-
-        # validate lines by removing those that do not join two circles; add the connected nodes to edge list
-        connections = []
-        for line in output:
-            connection = line.get_endpoints(circles, res)
-            if connection is not None and not Connection.list_contains(connections, connection):
-                connections.append(connection)
-        validated1_output.extend(connections)
-
-    # validate lines across multiple images: lines must exist in the majority of images to be valid
-    validated2_output = []
-    while len(validated1_output) > 0:
-        check = validated1_output.pop(0)
-        connections = [check]
-        for connection in validated1_output.copy():
-            if Connection.is_equal(check, connection):
-                validated1_output.remove(connection)
-                connections.append(connection)
-
-        if len(connections) > math.floor(len(cv_images) / 2):
-            validated2_output.append(check)
-    return edge_images, raw_lines, validated2_output
\ No newline at end of file
+        all_connections.append(connections)
+    return raw_lines, validate_lines(all_connections)
\ No newline at end of file
@@ -1,70 +1,96 @@
 import cv2
-import networkx as nx
+import numpy as np
 
 from backend.cvimage import CVImage
+from bloodweb import Bloodweb
 from matcher import Matcher
 from node import Node
+from resolutionprofile import ResolutionProfile
 from shapes import Position, Circle, Connection
 
 
 class Grapher:
+    change_threshold = 4 # mean grey level difference for a node to be checked again in update
+
     def __init__(self, circles: [Circle], connections: [Connection]):
         self.circles = circles
         self.connections = connections
 
-    def create(self):
-        nodes = []
-        ids = {}
+    def create(self) -> Bloodweb:
+        node_ids, names, positions, is_accessible, is_user_claimed = [], [], [], [], []
 
+        # slot i is self.circles[i], so connections join slots by the same indices
         i = 1
         for circle in self.circles:
             if circle.unique_id == "ORIGIN":
-                ids[circle] = "ORIGIN"
-                nodes.append(Node("ORIGIN", circle.unique_id, 9999, circle.xy(), True, True).get_tuple())
-                continue
+                node_ids.append("ORIGIN")
+                accessible, user_claimed = True, True
+            else:
+                node_ids.append(f"{i}_{circle.unique_id}")
+                accessible, user_claimed = Node.state_from_color(circle.color)
+                i += 1
+            names.append(circle.unique_id)
+            positions.append(circle.xy())
+            is_accessible.append(accessible)
+            is_user_claimed.append(user_claimed)
 
-            node_id = f"{i}_{circle.unique_id}"
-            ids[circle] = node_id
-            is_accessible, is_user_claimed = Node.state_from_color(circle.color)
-            nodes.append(Node(node_id, circle.unique_id, 9999, circle.xy(), is_accessible, is_user_claimed).get_tuple())
-            i += 1
+        bloodweb = Bloodweb(node_ids, names, positions, is_accessible, is_user_claimed) # all 9999
 
         # actual edges joining circles
-        edges = []
         for connection in self.connections:
-            edges.append((ids[connection.circle1], ids[connection.circle2]))
+            bloodweb.add_edge(connection.index1, connection.index2)
+        return bloodweb
+
+    @staticmethod
+    def changed_nodes(base_bloodweb: Bloodweb, previous_cv_image: CVImage, updated_cv_image: CVImage, res):
+        """
+        :return: slots of the present nodes whose squares (of unlockable_radius) differ between the two images by more
+                 than change_threshold, as a mean absolute difference in grey level
+        """
+        difference = cv2.absdiff(previous_cv_image.get_gray(), updated_cv_image.get_gray())
+        sums = cv2.integral(difference) # sum of difference[:y, :x] at sums[y, x]
+        height, width = difference.shape
 
-        # construct networkx graph
-        graph = nx.Graph()
-        graph.add_nodes_from(nodes)
-        graph.add_edges_from(edges)
-        return graph
+        ur = ResolutionProfile.get(res).unlockable_radius
+        slots = base_bloodweb.present()
+        x, y = base_bloodweb.x[slots], base_bloodweb.y[slots]
+        x1, y1 = np.clip(x - ur, 0, width), np.clip(y - ur, 0, height)
+        x2, y2 = np.clip(x + ur, 0, width), np.clip(y + ur, 0, height)
+        area = (x2 - x1) * (y2 - y1)
+        totals = sums[y2, x2] - sums[y1, x2] - sums[y2, x1] + sums[y1, x1]
+        return set(slots[(area > 0) & (totals > Grapher.change_threshold * area)].tolist())
 
     @staticmethod
-    def update(base_bloodweb, updated_cv_image: CVImage, res):
+    def update(base_bloodweb: Bloodweb, updated_cv_image: CVImage, res, previous_cv_image: CVImage = None,
+               selected=None):
+        """
+        Updates the colours of the unclaimed nodes and removes those consumed by the entity. If the image from before
+        the last selection is given, only the nodes that changed since then (see changed_nodes) are checked, along with
+        the selected node (slot) and its neighbours.
+
+        :return: slots of the nodes that were checked
+        """
         image_bgr = updated_cv_image.get_bgr()
         image_gray = updated_cv_image.get_gray()
-        image_filtered = cv2.convertScaleAbs(image_gray, alpha=1.4, beta=0)
-        image_filtered = cv2.fastNlMeansDenoising(image_filtered, None, 3, 7, 21)
-        # image_filtered = cv2.GaussianBlur(image_filtered, (self.res.gaussian_c(),
-        #                                   self.res.gaussian_c()), sigmaX=0, sigmaY=0)
-        # image_filtered = cv2.bilateralFilter(image_filtered, self.res.bilateral_c(), 200, 200)
 
-        to_remove = []
-        for node_id, data in base_bloodweb.nodes.items():
-            if data["is_user_claimed"]:
-                # the one the user just claimed is handled previously in the main method
-                continue
-            r, color, match_unique_id = Matcher.get_circle_properties(None, image_gray, image_bgr, image_filtered, None,
-                                                                      Position(int(data["x"]), int(data["y"])), res)
+        # the one the user just claimed is handled previously in the main method
+        unclaimed = base_bloodweb.unclaimed().tolist()
+        if previous_cv_image is not None:
+            to_check = Grapher.changed_nodes(base_bloodweb, previous_cv_image, updated_cv_image, res)
+            if selected is not None and base_bloodweb.is_present[selected]:
+                to_check.add(selected)
+                to_check.update(base_bloodweb.neighbours(selected).tolist())
+            unclaimed = [i for i in unclaimed if i in to_check]
+        positions = [Position(int(base_bloodweb.x[i]), int(base_bloodweb.y[i])) for i in unclaimed]
+        squares = Matcher.filter_squares(image_gray, positions, res)
+
+        for i, position, square in zip(unclaimed, positions, squares):
+            r, color, match_unique_id = Matcher.get_circle_properties(image_bgr, square, position, res)
             if all(x is None for x in (r, color, match_unique_id)):
                 # consumed by entity
-                to_remove.append(node_id)
+                base_bloodweb.remove(i)
             else:
                 # became available
-                is_accessible, is_user_claimed = Node.state_from_color(color)
-                nx.set_node_attributes(base_bloodweb, Node.from_dict(data, is_accessible=is_accessible,
-                                                                     is_user_claimed=is_user_claimed).get_dict())
+                base_bloodweb.set_state(i, *Node.state_from_color(color))
 
-        for node_id in to_remove:
-            base_bloodweb.remove_node(node_id)
\ No newline at end of file
+        return unclaimed
\ No newline at end of file
@@ -1,9 +1,9 @@
 import os
+import sys
 from pathlib import Path
 
-import cv2
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from image import Image
 from resolution import Resolution
 from simulation import Simulation
 
@@ -65,21 +65,9 @@ if __name__ == '__main__':
             s = p.split("/")[3]
             res = Resolution(int(s.split("x")[0]), int(s.split("x")[1].split("_")[0]), int(s.split("_")[-1]))
 
-            ratio = 1
+            cv_images, resolution = Simulation.load([os.path.join(subdir, file)], res)
 
-            path_to_image = os.path.join(subdir, file)
-            image_bgr = cv2.imread(path_to_image, cv2.IMREAD_COLOR)
-            image_gray = cv2.imread(path_to_image, cv2.IMREAD_GRAYSCALE)
-
-            if ratio != 1:
-                height, width = image_gray.shape
-                new_height, new_width = round(height / ratio), round(width / ratio)
-                image_bgr = cv2.resize(image_bgr, (new_width, new_height), interpolation=Image.interpolation)
-                image_gray = cv2.resize(image_gray, (new_width, new_height), interpolation=Image.interpolation)
-
-            images = {"bgr": image_bgr, "gray": image_gray}
-
-            sim = Simulation(images, res, False)
+            sim = Simulation(cv_images, resolution)
             sim.run()
             this_errors = abs(sim.num_circles - target[file])
             res.print()
@@ -90,6 +78,4 @@ if __name__ == '__main__':
                 # cv2.imshow("hhhhh", cv2.resize(sim.hhhhh, (width * 2 // 3, height * 2 // 3)))
                 # cv2.waitKey(0)
             num_errors += this_errors
-    print(num_errors)
-    """sim = Simulation("output/pic0.png", False)
-    sim.run()"""
\ No newline at end of file
+    print(num_errors)
\ No newline at end of file
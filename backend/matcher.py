@@ -1,6 +1,11 @@
+import os
+
 import cv2
 import numpy as np
 
+from image import Image
+from paths import Path
+from resolutionprofile import ResolutionProfile
 from utils.image_util import ImageUtil
 
 """
@@ -17,22 +22,118 @@ cv2.IMREAD_UNCHANGED
 """
 
 class Matcher:
+    candidates = 16 # icons compared at full resolution, of those that match best at half resolution
+    icon_refine_radius = 2 # pixels either side of an icon's half resolution match (at full resolution) to search
+    denoise_template_window, denoise_search_window = 7, 21
+    origin_confidence = 0.9 # TM_CCOEFF_NORMED score at which the previous level's origin type is taken straight away
+    origin_coarse_dim = 20 # smallest origin template width to downscale to for the coarse search
+    origin_refine_radius = 2 # pixels either side of the coarse match (at the coarse scale) to search at full scale
+    __origin_templates = {} # (width, height, ui_scale) -> see origin_templates
+
     def __init__(self, debugger, cv_images, res):
         self.debugger = debugger
         self.cv_images = cv_images
         self.res = res
 
     @staticmethod
-    def get_circle_properties(debugger, image_gray, image_bgr, image_filtered, merged_base, abs_position, res):
-        ur = res.unlockable_radius()
+    def origin_templates(res):
+        """
+        :return: list of (file, template, template_alpha, radius, coarse_template, coarse_alpha) for each origin in
+                 assets: its red channel and alpha (for masking) resized for res, and both downscaled by origin_scale.
+                 They are only read from disk and resized the first time.
+        """
+        key = (res.width, res.height, res.ui_scale)
+        if key not in Matcher.__origin_templates:
+            scale = Matcher.origin_scale(res)
+            templates = []
+            for file in sorted(os.listdir(Path.assets_origins)): # origin_basic_black, origin_basic_red etc.
+                dim = ResolutionProfile.get(res).origin_dims[file]
+                origin = cv2.split(cv2.imread(os.path.join(Path.assets_origins, file), cv2.IMREAD_UNCHANGED))
+                template = cv2.resize(origin[2], (dim, dim), interpolation=Image.interpolation)
+                template_alpha = cv2.resize(origin[3], (dim, dim), interpolation=Image.interpolation)
+                coarse_dim = round(dim / scale)
+                coarse_template = cv2.resize(template, (coarse_dim, coarse_dim), interpolation=cv2.INTER_AREA)
+                coarse_alpha = cv2.resize(template_alpha, (coarse_dim, coarse_dim), interpolation=cv2.INTER_AREA)
+                templates.append((file, template, template_alpha, round(dim / 2), coarse_template, coarse_alpha))
+            Matcher.__origin_templates[key] = templates
+        return Matcher.__origin_templates[key]
+
+    @staticmethod
+    def origin_scale(res):
+        """
+        :return: the factor (1, 2 or 4) to downscale by for the coarse origin search: as far as the smallest origin
+                 template stays at least origin_coarse_dim pixels across
+        """
+        smallest = min(ResolutionProfile.get(res).origin_dims.values())
+        scale = 1
+        while scale < 4 and smallest / (2 * scale) >= Matcher.origin_coarse_dim:
+            scale *= 2
+        return scale
 
-        square = image_filtered[abs_position.y-ur:abs_position.y+ur, abs_position.x-ur:abs_position.x+ur]
+    @staticmethod
+    def match_coarse_to_fine(image, coarse_image, scale, template, template_alpha, coarse_template, coarse_alpha):
+        """
+        Masked cv2.TM_CCOEFF_NORMED of template over image, searching the whole of coarse_image (image downscaled by
+        scale) with the coarse template first, then only the few pixels around the best coarse match at full scale.
+
+        :return: min_val, max_val, min_loc, max_loc (in image) as from cv2.minMaxLoc, over the full scale search
+        """
+        if scale == 1:
+            return cv2.minMaxLoc(cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, mask=template_alpha))
+
+        coarse = cv2.matchTemplate(coarse_image, coarse_template, cv2.TM_CCOEFF_NORMED, mask=coarse_alpha)
+        coarse[~np.isfinite(coarse)] = -1 # masked matching divides by zero on flat regions
+        _, _, _, (x, y) = cv2.minMaxLoc(coarse)
+
+        # the top lefts within origin_refine_radius coarse pixels of the coarse match, where the template fits
+        height, width = image.shape
+        dim = template.shape[0]
+        r = Matcher.origin_refine_radius * scale
+        left, top = min(max(x * scale - r, 0), width - dim), min(max(y * scale - r, 0), height - dim)
+        right, bottom = min(x * scale + r, width - dim), min(y * scale + r, height - dim)
+        window = image[top:bottom + dim, left:right + dim]
+
+        min_val, max_val, (min_x, min_y), (max_x, max_y) = \
+            cv2.minMaxLoc(cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED, mask=template_alpha))
+        return min_val, max_val, (left + min_x, top + min_y), (left + max_x, top + max_y)
+
+    @staticmethod
+    def filter_squares(image_gray, positions, res):
+        """
+        Contrast scales and denoises the squares of unlockable_radius around each position, exactly as filtering the
+        whole image would, but without filtering everywhere else. Each square is stacked with enough around it for
+        the denoising windows, and the stack is filtered as one image.
+
+        :return: array of the filtered squares, shape (len(positions), 2 * unlockable_radius, 2 * unlockable_radius)
+        """
+        ur = ResolutionProfile.get(res).unlockable_radius
+        if len(positions) == 0:
+            return np.empty((0, 2 * ur, 2 * ur), np.uint8)
+
+        margin = Matcher.denoise_search_window // 2 + Matcher.denoise_template_window // 2
+        border = ur + margin
+        padded = cv2.copyMakeBorder(image_gray, border, border, border, border, cv2.BORDER_REFLECT_101)
+
+        # position (x, y) in image_gray is (x + border, y + border) in padded
+        stack = np.stack([padded[position.y:position.y + 2 * border, position.x:position.x + 2 * border]
+                          for position in positions])
+        stack = cv2.convertScaleAbs(stack.reshape(-1, 2 * border), alpha=1.4, beta=0)
+        stack = cv2.fastNlMeansDenoising(stack, None, 3, Matcher.denoise_template_window,
+                                         Matcher.denoise_search_window)
+        return stack.reshape(-1, 2 * border, 2 * border)[:, margin:margin + 2 * ur, margin:margin + 2 * ur]
+
+    @staticmethod
+    def get_circle_properties(image_bgr, square, abs_position, res):
+        """
+        :param square: the filtered square around abs_position, from filter_squares
+        """
+        profile = ResolutionProfile.get(res)
 
         # identify if large (unclaimed) node exists
-        circles = cv2.HoughCircles(square, cv2.HOUGH_GRADIENT, dp=1, minDist=res.min_dist(), param1=10,
-                                   param2=45, minRadius=res.detect_radius(), maxRadius=res.detect_radius() + 20)
+        circles = cv2.HoughCircles(square, cv2.HOUGH_GRADIENT, dp=1, minDist=profile.min_dist, param1=10,
+                                   param2=45, minRadius=profile.detect_radius, maxRadius=profile.detect_radius + 20)
         if circles is None:
-            x, y, r = abs_position.x, abs_position.y, res.small_node_inner_radius()
+            x, y, r = abs_position.x, abs_position.y, profile.small_node_inner_radius
 
             # identify color
             unlockable = ImageUtil.cut_circle(image_bgr, (x, y), r)
@@ -43,9 +144,9 @@ class Matcher:
         else:
             # convert the (x, y) coordinates and radius of the circles to integers
             circles = np.round(circles[0, :]).astype("int")
-            if len(circles) > 1 or circles[0][2] < res.threshold_radius():
+            if len(circles) > 1 or circles[0][2] < profile.threshold_radius:
                 pass # TODO throw error
-            r = res.large_node_inner_radius()
+            r = profile.large_node_inner_radius
             # cv2.circle(square, (circles[0][0], circles[0][1]), r, 255, thickness=1)
             # cv2.imshow("square", square) # hhhhh
             # cv2.waitKey(0)
@@ -56,32 +157,75 @@ class Matcher:
             if color != "taupe" and color != "neutral":
                 return None, None, None # TODO threw error
 
-            # identify unlockable
-            r_small = r * 2 // 3
-            unlockable = image_gray[abs_position.y-r_small:abs_position.y+r_small,
-                                    abs_position.x-r_small:abs_position.x+r_small]
-            height, width = unlockable.shape
-
-            # only need radius and color
-            if merged_base is None:
-                return r, color, None
-
-            names = merged_base.names
-            images = merged_base.images
-
-            # apply template matching
-            base = images.copy()
-            result = cv2.matchTemplate(base, unlockable, cv2.TM_CCOEFF_NORMED)
-            # result = cv2.matchTemplate(base, unlockable, cv2.TM_CCORR_NORMED)
+            # unlockable is identified for all nodes at once (see match_unlockables)
+            return r, color, None
 
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-
-            top_left = max_loc
-            bottom_right = (top_left[0] + width, top_left[1] + height)
-            match = base[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
+    @staticmethod
+    def match_unlockables(debugger, image_gray, positions, merged_base, res):
+        """
+        Identifies the unlockables of all unclaimed nodes at once, with the same score as matching the square at each
+        node against the whole atlas - at every offset at which it fits in each template. Every icon is first scored
+        against each node at half resolution, at every one of those offsets, in one cv2.matchTemplate of the node's
+        square against merged_base.strip (each icon's score is the best in its block of columns). Only the best
+        candidates for each node are then matched at full resolution, around the offset at which each matched best.
+
+        :param positions: centres of the unclaimed nodes
+        :return: list of (unique_id, score) for each position
+        """
+        if len(positions) == 0:
+            return []
+
+        r_small = ResolutionProfile.get(res).large_node_inner_radius * 2 // 3
+        size = 2 * r_small
+        s = (merged_base.full_dim - size) // 2 # pixels either side of the centre of a template that the square fits
+        border = r_small + s + 2 # padded so that nodes at the edge still have a full crop
+        padded = cv2.copyMakeBorder(image_gray, border, border, border, border, cv2.BORDER_REPLICATE)
+
+        # coarse: every icon at half resolution, as one matchTemplate of each node's square against the atlas strip
+        half = cv2.resize(padded, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA).astype(np.float32)
+        half_size = size // 2
+        strip = merged_base.strip(2)
+        num_icons = len(merged_base.names)
+        tile_dim = strip.shape[1] // num_icons
+        coarse_scores = np.empty((len(positions), num_icons), np.float32)
+        coarse_locations = np.empty((len(positions), num_icons, 2), int) # (x, y) of each icon's best offset
+        for i, position in enumerate(positions):
+            # position (x, y) in image_gray is (x + border, y + border) in padded, and half that in half
+            x, y = (position.x + border) // 2 - half_size // 2, (position.y + border) // 2 - half_size // 2
+            result = cv2.matchTemplate(strip, half[y:y + half_size, x:x + half_size], cv2.TM_CCOEFF_NORMED)
+            # the columns of each icon's template, of which only the offsets at which the square fits inside it count
+            result = np.pad(result, ((0, 0), (0, half_size - 1)), constant_values=-1)
+            offsets = tile_dim - half_size + 1
+            result = result.reshape(len(result), num_icons, tile_dim)[:, :, :offsets].transpose(1, 0, 2)
+            result = result.reshape(num_icons, -1)
+            best = result.argmax(axis=1)
+            coarse_scores[i] = result[np.arange(num_icons), best]
+            coarse_locations[i, :, 1], coarse_locations[i, :, 0] = np.divmod(best, offsets)
+        num_candidates = min(Matcher.candidates, len(merged_base.names))
+        candidates = np.argpartition(-coarse_scores, num_candidates - 1, axis=1)[:, :num_candidates]
+
+        # fine: only the best candidates, at full resolution, around where they matched best at half resolution
+        refine = Matcher.icon_refine_radius
+        last = merged_base.full_dim - size # the last offset at which the square fits in a template
+        matches = []
+        for i, position in enumerate(positions):
+            x, y = position.x + border, position.y + border
+            unlockable = padded[y - r_small:y + r_small, x - r_small:x + r_small]
+            best_score, best_icon, best_location = -2, None, None
+            for icon in candidates[i]:
+                template = merged_base.window(icon, merged_base.full_dim)
+                cx, cy = 2 * coarse_locations[i, icon]
+                left, top = max(cx - refine, 0), max(cy - refine, 0)
+                right, bottom = min(cx + refine, last), min(cy + refine, last)
+                result = cv2.matchTemplate(template[top:bottom + size, left:right + size], unlockable,
+                                           cv2.TM_CCOEFF_NORMED)
+                _, score, _, (dx, dy) = cv2.minMaxLoc(result)
+                if score > best_score:
+                    best_score, best_icon, best_location = score, icon, (left + dx, top + dy)
 
             if debugger is not None:
-                debugger.add_icon(unlockable, match)
-
-            match_unique_id = names[round((bottom_right[1] - merged_base.full_dim / 2) / merged_base.full_dim)]
-            return r, color, match_unique_id
\ No newline at end of file
+                dx, dy = best_location
+                template = merged_base.window(best_icon, merged_base.full_dim)
+                debugger.add_icon(unlockable, template[dy:dy + size, dx:dx + size])
+            matches.append((merged_base.names[best_icon], best_score))
+        return matches
\ No newline at end of file
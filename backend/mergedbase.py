@@ -1,13 +1,19 @@
+import hashlib
 import math
+import os
 
 import cv2
 import numpy as np
 
 from data import Data
 from image import Image
+from paths import Path
+from resolutionprofile import ResolutionProfile
 
 
 class MergedBase:
+    cache_version = 1 # bump whenever the way templates are built changes
+
     def __init__(self, res, category=None, retired=False):
         """
         :param category: can be used to reduce the number of valid images needed to be drawn from
@@ -27,7 +33,9 @@ class MergedBase:
             categories.append("retired")
 
         self.res = res
-        self.full_dim = round(1 + self.res.mystery_box())
+        self.profile = ResolutionProfile.get(res)
+        self.full_dim = round(1 + self.profile.mystery_box)
+        self.__strips = {} # scale -> downscaled templates side by side, see strip
 
         image_paths = [(unlockable.image_path, unlockable.unique_id) for unlockable in Data.get_unlockables()
                        if unlockable.category in categories]
@@ -52,10 +60,97 @@ class MergedBase:
             else:
                 print(f"no source found for desired unlockable: {unlockable} under category: {category}")"""
 
+        # the finished atlas is cached to disk, keyed by everything that goes into building it
+        self.key = self.__cache_key(categories, image_paths)
+        cached = self.__load_cache()
+        if cached is not None:
+            self.names, self.images = cached
+            return
+
         valid_names, valid_images = self.__get_valid_images(image_paths)
 
         self.names = valid_names
         self.images = cv2.vconcat(valid_images)
+        self.__save_cache()
+
+    def __cache_key(self, categories, image_paths):
+        """
+        :return: a hash of the template dimensions, the category set and the size and modification time of every
+                 source icon, so that the atlas is rebuilt whenever an icon or the resolution changes
+        """
+        h = hashlib.sha1()
+        h.update(str(MergedBase.cache_version).encode())
+        h.update(str(Image.interpolation).encode())
+        h.update(str((self.full_dim, self.profile.mystery_box, self.profile.offerings, self.profile.perks,
+                      self.profile.items_addons)).encode())
+        h.update(",".join(sorted(categories)).encode())
+        for image_path, unique_id in image_paths:
+            try:
+                stat = os.stat(image_path)
+                h.update(f"{image_path}|{unique_id}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+            except OSError:
+                h.update(f"{image_path}|{unique_id}|missing".encode())
+        return h.hexdigest()
+
+    def window(self, index, size):
+        """
+        :return: the size x size square at the centre of the index-th template, where the icon is
+        """
+        offset = (self.full_dim - size) // 2
+        top = index * self.full_dim + offset
+        return self.images[top:top + size, offset:offset + size]
+
+    def strip(self, scale=1):
+        """
+        :param scale: factor to downscale each template by (averaging scale x scale blocks of pixels)
+        :return: float32 image of the templates side by side, each full_dim // scale wide, so that one matchTemplate
+                 against it matches every template (the i-th template's columns start at i * (full_dim // scale))
+        """
+        if scale not in self.__strips:
+            dim = self.full_dim // scale
+            tiles = self.images.reshape(len(self.names), self.full_dim, self.full_dim)[:, :dim * scale, :dim * scale]
+            tiles = tiles.astype(np.float32).reshape(len(self.names), dim, scale, dim, scale).mean(axis=(2, 4))
+            self.__strips[scale] = np.ascontiguousarray(tiles.transpose(1, 0, 2).reshape(dim, len(self.names) * dim))
+        return self.__strips[scale]
+
+    def chunks(self, size=64, columns=8):
+        """
+        :return: list of (names, image): the atlas in chunks of up to size templates, each laid out in a grid columns
+                 templates wide, so that it can be viewed a chunk at a time instead of as one tall strip
+        """
+        tiles = self.images.reshape(len(self.names), self.full_dim, self.full_dim)
+        chunks = []
+        for start in range(0, len(self.names), size):
+            chunk = tiles[start:start + size]
+            rows = math.ceil(len(chunk) / columns)
+            grid = np.zeros((rows * columns, self.full_dim, self.full_dim), np.uint8)
+            grid[:len(chunk)] = chunk
+            grid = grid.reshape(rows, columns, self.full_dim, self.full_dim).transpose(0, 2, 1, 3)
+            chunks.append((self.names[start:start + size], grid.reshape(rows * self.full_dim, columns * self.full_dim)))
+        return chunks
+
+    def cache_path(self):
+        return f"{Path.cache_atlas}/{self.key}.npz"
+
+    def __load_cache(self):
+        if not os.path.isfile(self.cache_path()):
+            return None
+        try:
+            with np.load(self.cache_path(), allow_pickle=False) as cached:
+                return cached["names"].tolist(), cached["images"]
+        except (OSError, ValueError, KeyError):
+            print(f"invalid atlas cache {self.cache_path()}; rebuilding")
+            return None
+
+    def __save_cache(self):
+        try:
+            os.makedirs(Path.cache_atlas, exist_ok=True)
+            # write to a temporary file first so that an interrupted run never leaves a truncated cache
+            temp_path = f"{Path.cache_atlas}/{self.key}.tmp.npz"
+            np.savez(temp_path, names=np.array(self.names), images=self.images)
+            os.replace(temp_path, self.cache_path())
+        except OSError:
+            print(f"could not write atlas cache {self.cache_path()}")
 
     def __get_valid_images(self, image_paths):
         ret_names = []
@@ -64,13 +159,13 @@ class MergedBase:
             image_name = image_path.split("\\")[-1]
 
             if "mysteryBox" in image_name:
-                dim = self.res.mystery_box()
+                dim = self.profile.mystery_box
             elif "Favors" in image_name:
-                dim = self.res.offerings()
+                dim = self.profile.offerings
             elif "Perks" in image_name:
-                dim = self.res.perks()
+                dim = self.profile.perks
             elif "Addon" in image_name or "Items" in image_name:
-                dim = self.res.items_addons()
+                dim = self.profile.items_addons
             else:
                 print(f"error merging base with {image_path}")
                 continue
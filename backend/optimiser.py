@@ -1,83 +1,100 @@
-import copy
-import math
 import random
 
-import networkx as nx
+import numpy as np
 
-from config import Config
-from node import Node
+from bloodweb import Bloodweb
+from config import CompiledProfile
 
 
 class Optimiser:
-    def __init__(self, graph):
-        self.base_graph = graph
-        self.dijkstra_graph = None
-
-    def dijkstra(self, desired_node_id, tier, subtier):
-        heatmap = copy.deepcopy(self.base_graph)
-        desired_value = -(9999 * tier + subtier)
-        base_data = self.base_graph.nodes[desired_node_id]
-        nx.set_node_attributes(heatmap, Node.from_dict(base_data, value=desired_value).get_dict())
-
-        if heatmap.nodes[desired_node_id]["is_accessible"]:
-            return heatmap
-
-        edited = True
-        while edited:
-            edited = False
-            for node_id, data in heatmap.nodes.items():
-                if node_id == "ORIGIN":
-                    continue
-
-                neighbor_values = [heatmap.nodes[neighbor]["value"] for neighbor in heatmap.neighbors(node_id)
-                                   if not heatmap.nodes[neighbor]["is_accessible"]]
-                lowest_neighbor_value = min(neighbor_values) if len(neighbor_values) > 0 else 9999 # if node is not connected to rest of graph
-                if data["value"] > lowest_neighbor_value + 1:
-                    nx.set_node_attributes(heatmap, Node.from_dict(data, value=lowest_neighbor_value + 1).get_dict())
-                    edited = True
-
-        return heatmap
-
-    @staticmethod
-    def add_graphs(graphs):
-        total = copy.deepcopy(graphs[0])
-        for graph in graphs[1:]:
-            for node_id, data in graph.nodes.items():
-                total_data = total.nodes[node_id]
-                nx.set_node_attributes(total, Node.from_dict(total_data, value=total_data["value"] + data["value"]).get_dict())
-        return total
+    def __init__(self, bloodweb: Bloodweb):
+        self.base_bloodweb = bloodweb
+        self.dijkstra_graph = None # copy of the bloodweb with the values from the heatmap
+        self.values = None
 
-    def select_best(self):
-        min_id, min_val = ["ORIGIN"], [math.inf]
-        for node_id, data in self.dijkstra_graph.nodes.items():
-            if data["is_accessible"] and not data["is_user_claimed"]:
-                if data["value"] < min(min_val):
-                    min_id, min_val = [node_id], [data["value"]]
-                elif data["value"] == min(min_val):
-                    min_id.append(node_id)
-                    min_val.append(data["value"])
-
-        return Node.from_dict(self.dijkstra_graph.nodes[random.choice(min_id)])
-
-    def run(self, profile_id):
-        config = Config()
-        graphs = []
-        for node_id, data in self.base_graph.nodes.items():
-            if data["is_user_claimed"]: # claimed
-                pass
-            else:
-                tier, subtier = config.preference(data["name"], profile_id)
-                if tier > 0: # desirable and unclaimed
-                    graphs.append(self.dijkstra(node_id, tier, subtier))
-                elif tier < 0: # temp: undesirable and unclaimed
-                    heatmap = copy.deepcopy(self.base_graph)
-                    cost = heatmap.nodes[node_id]["value"] - 9999 * tier + subtier
-                    nx.set_node_attributes(heatmap, Node.from_dict(heatmap.nodes[node_id], value=cost).get_dict())
-                    graphs.append(heatmap)
-                # TODO tier 0 with subtier
-
-        if len(graphs) == 0:
-            graphs = [self.base_graph]
+        # node i in node_ids is row / column i of the adjacency matrix
+        self.node_ids = bloodweb.node_ids
+        self.adjacency = bloodweb.adjacency_matrix().astype(np.int32)
+        self.base_values = bloodweb.value.copy()
+        self.is_accessible = bloodweb.is_accessible.copy()
+        # nodes consumed by the entity have no edges and are never selected, as if claimed
+        self.is_user_claimed = bloodweb.is_user_claimed | ~bloodweb.is_present
+        self.is_origin = np.array([node_id == "ORIGIN" for node_id in self.node_ids], dtype=bool)
+
+    def distances(self, sources):
+        """
+        Breadth-first search from every source simultaneously. Paths may only continue through inaccessible nodes,
+        since an accessible node can be selected directly and does not need to be reached via its neighbours.
+
+        :param sources: array of node indices
+        :return: (len(sources), number of nodes) array of hop counts from each source, -1 where unreachable
+        """
+        num_sources, num_nodes = len(sources), len(self.node_ids)
+        rows = np.arange(num_sources)
+
+        distances = np.full((num_sources, num_nodes), -1, dtype=np.int64)
+        distances[rows, sources] = 0
+        frontier = np.zeros((num_sources, num_nodes), dtype=bool)
+        frontier[rows, sources] = True
+
+        hops = 0
+        while frontier.any():
+            hops += 1
+            expanding = (frontier & ~self.is_accessible).astype(np.int32)
+            frontier = (expanding @ self.adjacency > 0) & (distances < 0)
+            distances[frontier] = hops
+        return distances
+
+    def heatmap(self, preferences):
+        """
+        Sums the value contributed by every desirable and undesirable unclaimed node into a single vector. Nodes
+        outside the reach of a desirable node keep their value from the base graph (9999, as set by Grapher).
+
+        :param preferences: list of (tier, subtier) for each node, in the same order as node_ids
+        :return: array of values, in the same order as node_ids
+        """
+        tiers = np.array([tier for tier, _ in preferences], dtype=np.int64).reshape(-1)
+        subtiers = np.array([subtier for _, subtier in preferences], dtype=np.int64).reshape(-1)
+        unclaimed = ~self.is_user_claimed
+
+        # desirable and unclaimed: value spreads outwards from the node, increasing by 1 per hop
+        desired = np.flatnonzero(unclaimed & (tiers > 0))
+        desired_values = -(9999 * tiers[desired] + subtiers[desired])
+        distances = self.distances(desired)
+        reached = (distances > 0) & ~self.is_origin
+        spread = np.minimum(self.base_values, desired_values[:, np.newaxis] + distances)
+        desired_heatmaps = np.where(reached, spread, self.base_values)
+        desired_heatmaps[np.arange(len(desired)), desired] = desired_values
+
+        # temp: undesirable and unclaimed: only the node itself is penalised
+        undesired = np.flatnonzero(unclaimed & (tiers < 0))
+        undesired_heatmaps = np.tile(self.base_values, (len(undesired), 1))
+        undesired_heatmaps[np.arange(len(undesired)), undesired] += -9999 * tiers[undesired] + subtiers[undesired]
+        # TODO tier 0 with subtier
+
+        heatmaps = np.vstack([desired_heatmaps, undesired_heatmaps])
+        if len(heatmaps) == 0:
+            return self.base_values.copy()
 
         # TODO in the future, add desirability (lower weight (value)) to nodes which are in danger and are desirable
-        self.dijkstra_graph = self.add_graphs(graphs)
\ No newline at end of file
+        return heatmaps.sum(axis=0)
+
+    def apply(self, preferences):
+        self.values = self.heatmap(preferences)
+        self.dijkstra_graph = self.base_bloodweb.copy()
+        self.dijkstra_graph.value[:] = self.values
+
+    def select_best(self):
+        selectable = self.is_accessible & ~self.is_user_claimed
+        min_id = ["ORIGIN"]
+        if selectable.any():
+            min_val = self.values[selectable].min()
+            min_id = [self.node_ids[i] for i in np.flatnonzero(selectable & (self.values == min_val))]
+
+        return self.dijkstra_graph.node(self.dijkstra_graph.index[random.choice(min_id)])
+
+    def run(self, profile: CompiledProfile):
+        # each distinct unlockable is only looked up once
+        name_preferences = [profile.preference(name) for name in self.base_bloodweb.names]
+        self.apply([name_preferences[self.base_bloodweb.name_index[i]] if not self.is_user_claimed[i] else (0, 0)
+                    for i in range(len(self.node_ids))])
\ No newline at end of file
@@ -0,0 +1,127 @@
+import copy
+import random
+import time
+
+import networkx as nx
+
+from bloodweb import Bloodweb
+from node import Node
+from optimiser import Optimiser
+from resolution import Resolution
+
+"""
+Times the optimiser for a single click on a full 30 node bloodweb, and checks it against the original heatmap
+implementation (one deep-copied graph per desirable node, relaxed until nothing changes).
+"""
+
+def legacy_run(base_graph, preferences):
+    def dijkstra(desired_node_id, tier, subtier):
+        heatmap = copy.deepcopy(base_graph)
+        desired_value = -(9999 * tier + subtier)
+        nx.set_node_attributes(heatmap, Node.from_dict(base_graph.nodes[desired_node_id],
+                                                       value=desired_value).get_dict())
+        if heatmap.nodes[desired_node_id]["is_accessible"]:
+            return heatmap
+
+        edited = True
+        while edited:
+            edited = False
+            for node_id, data in heatmap.nodes.items():
+                if node_id == "ORIGIN":
+                    continue
+                neighbor_values = [heatmap.nodes[neighbor]["value"] for neighbor in heatmap.neighbors(node_id)
+                                   if not heatmap.nodes[neighbor]["is_accessible"]]
+                lowest_neighbor_value = min(neighbor_values) if len(neighbor_values) > 0 else 9999
+                if data["value"] > lowest_neighbor_value + 1:
+                    nx.set_node_attributes(heatmap, Node.from_dict(data, value=lowest_neighbor_value + 1).get_dict())
+                    edited = True
+        return heatmap
+
+    graphs = []
+    for node_id, data in base_graph.nodes.items():
+        if not data["is_user_claimed"]:
+            tier, subtier = preferences[node_id]
+            if tier > 0:
+                graphs.append(dijkstra(node_id, tier, subtier))
+            elif tier < 0:
+                heatmap = copy.deepcopy(base_graph)
+                cost = heatmap.nodes[node_id]["value"] - 9999 * tier + subtier
+                nx.set_node_attributes(heatmap, Node.from_dict(heatmap.nodes[node_id], value=cost).get_dict())
+                graphs.append(heatmap)
+    if len(graphs) == 0:
+        graphs = [base_graph]
+
+    total = copy.deepcopy(graphs[0])
+    for graph in graphs[1:]:
+        for node_id, data in graph.nodes.items():
+            total_data = total.nodes[node_id]
+            nx.set_node_attributes(total, Node.from_dict(total_data,
+                                                         value=total_data["value"] + data["value"]).get_dict())
+    return total
+
+def legacy_candidates(graph):
+    candidates, best = [], None
+    for node_id, data in graph.nodes.items():
+        if data["is_accessible"] and not data["is_user_claimed"]:
+            if best is None or data["value"] < best:
+                candidates, best = [node_id], data["value"]
+            elif data["value"] == best:
+                candidates.append(node_id)
+    return candidates if len(candidates) > 0 else ["ORIGIN"]
+
+def random_bloodweb(rng, res):
+    """
+    A full bloodweb: the origin and all 30 nodes, with each node joined to one or two nodes in the ring inside it.
+    """
+    circles = res.circles()
+    rings = [[0], list(range(1, 7)), list(range(7, 19)), list(range(19, 31))]
+    node_ids, names, positions, is_accessible, is_user_claimed = ["ORIGIN"], ["ORIGIN"], [(0, 0)], [True], [True]
+    for circle_num, position in circles.items():
+        node_ids.append(f"{circle_num}_unlockable{circle_num}")
+        names.append(f"unlockable{circle_num}")
+        positions.append(position.xy())
+        is_accessible.append(circle_num <= 6 and rng.random() < 0.8)
+        is_user_claimed.append(is_accessible[-1] and rng.random() < 0.2)
+    bloodweb = Bloodweb(node_ids, names, positions, is_accessible, is_user_claimed)
+
+    # slot i is circle number i
+    for inner, outer in zip(rings, rings[1:]):
+        for circle_num in outer:
+            for neighbour in rng.sample(inner, min(len(inner), rng.choice([1, 2]))):
+                bloodweb.add_edge(circle_num, neighbour)
+
+    preferences = {node_id: (rng.choice([-2, -1, 0, 0, 0, 1, 2, 3]), rng.randint(0, 9)) for node_id in node_ids}
+    preferences["ORIGIN"] = (0, 0)
+    return bloodweb, preferences
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    res = Resolution(1920, 1080, 100)
+    webs = [random_bloodweb(rng, res) for _ in range(200)]
+
+    legacy_time = 0
+    new_time = 0
+    mismatches = 0
+    for bloodweb, preferences in webs:
+        graph = bloodweb.to_networkx()
+        start = time.perf_counter()
+        total = legacy_run(graph, preferences)
+        expected = legacy_candidates(total)
+        legacy_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        optimiser = Optimiser(bloodweb)
+        optimiser.apply([preferences[node_id] for node_id in optimiser.node_ids])
+        optimiser.select_best()
+        new_time += time.perf_counter() - start
+
+        dijkstra_graph = optimiser.dijkstra_graph.to_networkx()
+        actual = legacy_candidates(dijkstra_graph)
+        if actual != expected or any(total.nodes[node_id]["value"] != data["value"]
+                                     for node_id, data in dijkstra_graph.nodes.items()):
+            mismatches += 1
+
+    print(f"{len(webs)} bloodwebs of {len(webs[0][0]) - 1} nodes")
+    print(f"legacy:    {legacy_time / len(webs) * 1000:.2f} ms per click")
+    print(f"optimiser: {new_time / len(webs) * 1000:.2f} ms per click")
+    print(f"mismatched selections: {mismatches}")
\ No newline at end of file
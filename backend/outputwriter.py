@@ -0,0 +1,107 @@
+import traceback
+from collections import OrderedDict
+from threading import Thread, Condition
+
+import cv2
+
+from utils.network_util import NetworkUtil
+
+
+class OutputWriter(Thread):
+    """
+    Writes Debugger output (images and pyvis HTML) on a background thread, so that recording a run does not hold up
+    the clicks. At most max_pending jobs wait to be written, keyed by path: a job for a path that is already waiting
+    replaces the waiting one (e.g. the run's atlas.json, which is written for every level), and any other job is
+    dropped while the writer is full.
+    """
+    max_pending = 32
+
+    def __init__(self, png_compression=None):
+        """
+        :param png_compression: zlib level of png images, from 0 (uncompressed) to 9 (smallest), or None for
+                                OpenCV's default, which is the fastest (a fast level with run-length filtering) and
+                                about as small
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.png_compression = png_compression
+
+        self.pending = OrderedDict() # path -> function which writes it, in the order they were submitted
+        self.condition = Condition()
+        self.writing = False
+        self.stopped = False
+        self.coalesced = 0
+        self.dropped = 0
+
+    def write_image(self, path, image):
+        """
+        :param image: array to write to path, which must not be modified afterwards (it is written when its turn
+                      comes, not copied)
+        """
+        params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression] \
+            if path.endswith(".png") and self.png_compression is not None else []
+        self.__submit(path, lambda: cv2.imwrite(path, image, params))
+
+    def write_html(self, bloodweb, file_name):
+        """
+        :param file_name: path of the html file, without the extension (as in NetworkUtil.write_to_html)
+        """
+        bloodweb = bloodweb.copy() # as it is now: it may change (e.g. nodes claimed) before it's written
+        self.__submit(f"{file_name}.html", lambda: NetworkUtil.write_to_html(bloodweb, file_name))
+
+    def write_text(self, path, text):
+        def write():
+            with open(path, "w") as file:
+                file.write(text)
+        self.__submit(path, write)
+
+    def __submit(self, path, job):
+        with self.condition:
+            if self.stopped:
+                return
+            if path in self.pending:
+                del self.pending[path]
+                self.coalesced += 1
+            elif len(self.pending) >= OutputWriter.max_pending:
+                self.dropped += 1
+                print(f"output writer full: dropped {path}")
+                return
+            self.pending[path] = job
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending) > 0 or self.stopped)
+                if len(self.pending) == 0:
+                    return
+                _, job = self.pending.popitem(last=False)
+                self.writing = True
+            try:
+                job()
+            except:
+                traceback.print_exc() # a failed write must not stop the rest
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until everything submitted so far has been written.
+
+        :return: whether it was all written before the timeout
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.pending) == 0 and not self.writing, timeout)
+
+    def stop(self, timeout=None):
+        """
+        Writes everything submitted so far, then ends the thread. Nothing can be submitted afterwards.
+        """
+        flushed = self.flush(timeout)
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        print(f"output writer stopped: {'flushed' if flushed else 'timed out'}, "
+              f"{self.coalesced} coalesced, {self.dropped} dropped")
\ No newline at end of file
@@ -20,6 +20,10 @@ class Path:
     assets_origins = "assets/origins"
     assets_database = "assets/data.db"
 
+    cache = "cache"
+    cache_atlas = "cache/atlas"
+    cache_icon_index = "cache/icon_index.json"
+
     @staticmethod
     def assets_file(category, unlockable):
         return f"{Path.assets}/{category}/{unlockable}.png"
\ No newline at end of file
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+from multiprocessing import Pipe
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from devices import ReplayCapture, StubInput
+from state import StateProcess
+
+"""
+Replays images recorded by Debugger (run with "Write Output to Folder") through the whole pipeline, without the game,
+and reports throughput and latency. Uses the resolution in config.json, which should match the recording.
+
+usage: python backend/replay_benchmark.py <recording folder> [profile] [character]
+"""
+
+if __name__ == "__main__":
+    directory = sys.argv[1]
+    profile_id = sys.argv[2] if len(sys.argv) > 2 else "blank"
+    character = sys.argv[3] if len(sys.argv) > 3 else "survivor"
+
+    if not os.path.isdir("logs"):
+        os.mkdir("logs")
+
+    capture = ReplayCapture(directory)
+    inputs = StubInput()
+    main_pipe, state_pipe = Pipe()
+    state = StateProcess(state_pipe, (False, False, False, profile_id, character, None, None), capture, inputs)
+
+    start = time.perf_counter()
+    state.run() # in this process, not as a separate process
+    end = time.perf_counter()
+    sys.stdout = sys.__stdout__
+    sys.stderr = sys.__stderr__
+
+    signals = []
+    while main_pipe.poll():
+        signals.append(main_pipe.recv())
+
+    levels = capture.level_times + [end]
+    level_latencies = [next_level - level for level, next_level in zip(levels, levels[1:])]
+    selections = [timestamp for timestamp, _ in inputs.selections()]
+    selection_latencies = [selection - previous for previous, selection in zip([start] + selections, selections)]
+
+    print(f"replayed {len(capture.level_times)} / {len(capture.levels)} levels from {directory}")
+    print(f"total:      {end - start:.3f}s")
+    if len(level_latencies) > 0:
+        print(f"per level:  {sum(level_latencies) / len(level_latencies):.3f}s mean, "
+              f"{max(level_latencies):.3f}s max")
+    if len(selection_latencies) > 0:
+        print(f"per click:  {sum(selection_latencies) / len(selection_latencies):.3f}s mean, "
+              f"{max(selection_latencies):.3f}s max ({len(selections)} nodes selected)")
+    print(f"final signal: {signals[-1] if len(signals) > 0 else None}")
\ No newline at end of file
@@ -131,6 +131,16 @@ class Resolution:
     def ratio(self):
         return self.height / Resolution.__height * self.ui_scale / Resolution.__ui_scale
 
+    def normalise(self):
+        """
+        Images are downscaled to 1080p at 100% UI scale before being processed (saves computation).
+
+        :return: (the resolution of the downscaled images, the factor by which to downscale)
+        """
+        if self.height != 1080 or self.ui_scale != 100:
+            return Resolution(1080 * self.width / self.height, 1080, 100), self.height / 1080 * self.ui_scale / 100
+        return self, 1
+
     # screenshot dimensions and points
     # https://www.desmos.com/calculator/4psfavvzoz
     # https://www.desmos.com/calculator/hcxllwtp44 6.1.0
@@ -0,0 +1,79 @@
+import os
+from collections import namedtuple
+from types import MappingProxyType
+
+import numpy as np
+
+from paths import Path
+from resolution import Resolution
+from utils.image_util import ImageUtil
+
+
+class ResolutionProfile(namedtuple("ResolutionProfile", [
+        "width", "height", "ui_scale", "ratio",
+        # node sizes
+        "threshold_radius", "large_node_inner_radius", "small_node_inner_radius", "unlockable_radius",
+        "detect_radius", "min_dist", "outer_radii",
+        # vector circles
+        "slots", "positions", "circles",
+        # origin
+        "origin_dims",
+        # hough lines
+        "canny_min", "canny_max", "line_length", "endpoint_distance_sq",
+        # template matching
+        "mystery_box", "items_addons", "offerings", "perks",
+        # masks
+        "annulus_masks"])):
+    """
+    Everything derived from a Resolution that the pipeline reads while running, computed once per (width, height,
+    ui_scale) instead of on every call. Its fields, the arrays and mappings in them included, are read-only.
+
+    slots: the circle numbers of Resolution.circles, in order
+    positions: (len(slots), 2) array of the position of each slot relative to the origin
+    circles: circle number -> Position relative to the origin, as from Resolution.circles
+    origin_dims: origin file name -> template dimension, as from Resolution.origin_dim
+    outer_radii: radius -> radius + Resolution.additional_radius(radius), for the radius of each node size and origin
+    endpoint_distance_sq: a line ends at a circle if its end is less than this squared distance from the centre
+    annulus_masks: radius -> ImageUtil.annulus_mask, for each node radius (so they are drawn before they are needed)
+    """
+    __slots__ = ()
+
+    __profiles = {} # (width, height, ui_scale) -> ResolutionProfile
+
+    @staticmethod
+    def get(res: Resolution):
+        """
+        :return: the profile of res, which is only built the first time
+        """
+        key = (res.width, res.height, res.ui_scale)
+        if key not in ResolutionProfile.__profiles:
+            ResolutionProfile.__profiles[key] = ResolutionProfile.build(res)
+        return ResolutionProfile.__profiles[key]
+
+    @staticmethod
+    def build(res: Resolution):
+        circles = res.circles()
+        slots = tuple(circles.keys())
+
+        annulus_masks = {radius: ImageUtil.annulus_mask(radius)
+                         for radius in [res.small_node_inner_radius(), res.large_node_inner_radius()]}
+        positions = np.array([circles[slot].xy() for slot in slots], np.int32)
+        positions.setflags(write=False)
+        origin_dims = {file: res.origin_dim(file) for file in sorted(os.listdir(Path.assets_origins))}
+        # every radius a Circle can have: the node radii, and half each origin template (as in Matcher.origin_templates)
+        radii = [res.small_node_inner_radius(), res.large_node_inner_radius()] + \
+            [round(dim / 2) for dim in origin_dims.values()]
+
+        return ResolutionProfile(
+            width=res.width, height=res.height, ui_scale=res.ui_scale, ratio=res.ratio(),
+            threshold_radius=res.threshold_radius(), large_node_inner_radius=res.large_node_inner_radius(),
+            small_node_inner_radius=res.small_node_inner_radius(), unlockable_radius=res.unlockable_radius(),
+            detect_radius=res.detect_radius(), min_dist=res.min_dist(),
+            outer_radii=MappingProxyType({radius: radius + Resolution.additional_radius(radius) for radius in radii}),
+            slots=slots, positions=positions, circles=MappingProxyType(circles),
+            origin_dims=MappingProxyType(origin_dims),
+            canny_min=res.canny_min(), canny_max=res.canny_max(), line_length=res.line_length(),
+            endpoint_distance_sq=15000 * res.ratio() ** 2,
+            mystery_box=res.mystery_box(), items_addons=res.items_addons(), offerings=res.offerings(),
+            perks=res.perks(),
+            annulus_masks=MappingProxyType(annulus_masks))
\ No newline at end of file
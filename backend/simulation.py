@@ -1,71 +1,100 @@
-from pprint import pprint
+import time
 
-import networkx as nx
+import cv2
 
-from matcher import HoughTransform, IconMatcher
-from mergedbase import MergedBase
-from node import Node
+from config import CompiledProfile
+from cvimage import CVImage
+from functions import match_origin, vector_circles, match_lines
+from grapher import Grapher
+from image import Image
 from optimiser import Optimiser
-from utils.network_util import NetworkUtil
 
 
-# TODO fix
 class Simulation:
-    def __init__(self, images, res, run_optimiser=True):
-        self.images = images
+    """
+    Runs the same pipeline as StateProcess on recorded images instead of the screen, without clicking anything.
+    """
+    def __init__(self, cv_images: [CVImage], res, merged_base=None, run_optimiser=False, profile=None,
+                 edge_detection="hough"):
+        """
+        :param cv_images: images of the bloodweb, already downscaled to res (see Simulation.load)
+        :param merged_base: used to identify unlockables; if None, only circles and their colours are matched
+        :param run_optimiser: whether to select nodes until the bloodweb is cleared, as if every selection succeeded
+        :param profile: CompiledProfile used by the optimiser (default: blank)
+        :param edge_detection: how lines are detected (see match_lines)
+        """
+        self.cv_images = cv_images
         self.res = res
+        self.merged_base = merged_base
         self.run_optimiser = run_optimiser
+        self.profile = profile if profile is not None else CompiledProfile.get("blank")
+        self.edge_detection = edge_detection
+
+        self.timings = {} # stage -> seconds
+        self.origin = None
+        self.origin_type = None
+        self.circles = []
+        self.num_circles = 0
+        self.connections = []
+        self.base_bloodweb = None
+        self.selected = []
+
+    @staticmethod
+    def load(paths, base_res):
+        """
+        :param paths: image files, each of the capture region at base_res
+        :return: (images downscaled as in StateProcess, the resolution of the downscaled images)
+        """
+        resolution, ratio = base_res.normalise()
+        cv_images = []
+        for path in paths:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if ratio != 1:
+                height, width, _ = image.shape
+                image = cv2.resize(image, (round(width / ratio), round(height / ratio)),
+                                   interpolation=Image.interpolation)
+            cv_images.append(CVImage(image))
+        return cv_images, resolution
+
+    def __time(self, stage, start):
+        self.timings[stage] = self.timings.get(stage, 0) + time.perf_counter() - start
 
     def run(self):
-        if self.run_optimiser:
-            # initialisation: merged base for template matching
-            merged_base = MergedBase(self.res)
+        start = time.perf_counter()
+        self.origin, self.origin_type, _ = match_origin(self.cv_images[0], self.res)
+        self.__time("origin", start)
 
-        # hough transform: detect circles and lines
-        nodes_connections = HoughTransform(self.images, self.res)
-        self.num_circles = len(nodes_connections.circles)
-        self.image = nodes_connections.output
-        self.hhhhh = nodes_connections.hhhhh
+        start = time.perf_counter()
+        self.circles = vector_circles(self.cv_images[0], self.res, self.origin, self.merged_base, None)
+        self.num_circles = len(self.circles) - 1 # excluding origin
+        self.__time("circles", start)
 
-        # cv2.imshow("cropped for origin matching", nodes_connections.cropped)
-        # # cv2.imshow("matched origin", cv2.split(cv2.imread(f"{Path.assets_origins}/{nodes_connections.origin_type}", cv2.IMREAD_UNCHANGED))[2])
-        # cv2.imshow("edges for matching lines", nodes_connections.edges)
-        # cv2.imshow("unfiltered raw output (r-adjusted)", nodes_connections.output)
-        # cv2.imshow("validated & processed output (r-adjusted)", nodes_connections.output_validated)
-        # cv2.waitKey(0)
+        start = time.perf_counter()
+        _, _, self.connections = match_lines(self.cv_images, self.res, self.circles,
+                                             edge_detection=self.edge_detection)
+        self.__time("lines", start)
 
-        # resized to 2/3
-        # cv2.imshow("edges for matching lines", cv2.resize(nodes_connections.edges, (nodes_connections.edges.shape[1] * 2 // 3, nodes_connections.edges.shape[0] * 2 // 3)))
-        # cv2.imshow("unfiltered raw output (r-adjusted)", cv2.resize(nodes_connections.output, (nodes_connections.output.shape[1] * 2 // 3, nodes_connections.output.shape[0] * 2 // 3)))
-        # cv2.imshow("validated & processed output (r-adjusted)", cv2.resize(nodes_connections.output_validated, (nodes_connections.output_validated.shape[1] * 2 // 3, nodes_connections.output_validated.shape[0] * 2 // 3)))
-        # cv2.waitKey(0)
+        start = time.perf_counter()
+        self.base_bloodweb = Grapher(self.circles, self.connections).create()
+        self.__time("graph", start)
 
-        if self.run_optimiser:
-            # match circles to unlockables: create networkx graph of nodes
-            matcher = IconMatcher(self.images["bgr"], nodes_connections, merged_base)
-            base_bloodweb = matcher.graph # all 9999
+        if not self.run_optimiser:
+            return
 
-        i = 0
-        run = self.run_optimiser
-        while run:
+        bloodweb = self.base_bloodweb.copy()
+        while len(bloodweb.unclaimed()) > 0:
             # correct reachable nodes
-            for node_id, data in base_bloodweb.nodes.items():
-                if any([base_bloodweb.nodes[neighbour]["is_user_claimed"] for neighbour in
-                        base_bloodweb.neighbors(node_id)]) and not data["is_accessible"]:
-                    nx.set_node_attributes(base_bloodweb, Node.from_dict(data, is_accessible=True).get_dict())
+            bloodweb.correct_accessibility()
 
             # run through optimiser
-            optimiser = Optimiser(base_bloodweb)
-            optimiser.run("blank")
+            start = time.perf_counter()
+            optimiser = Optimiser(bloodweb)
+            optimiser.run(self.profile)
             optimal_unlockable = optimiser.select_best()
-            pprint(optimal_unlockable.get_tuple())
-            NetworkUtil.write_to_html(optimiser.dijkstra_graph, f"output/dijkstra{i}")
+            self.__time("optimiser", start)
+            if optimal_unlockable.node_id == "ORIGIN":
+                break # the rest are unreachable
+            self.selected.append(optimal_unlockable.node_id)
 
             # select the node
-            optimal_unlockable.set_user_claimed(True)
-            optimal_unlockable.set_value(9999)
-            nx.set_node_attributes(base_bloodweb, optimal_unlockable.get_dict())
-            i += 1
-
-            if all([data["is_user_claimed"] for data in base_bloodweb.nodes.values()]):
-                run = False
+            bloodweb.claim(bloodweb.index[optimal_unlockable.node_id])
@@ -0,0 +1,123 @@
+import bisect
+import json
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    """
+    Durations of one stage, counted into fixed buckets so that levels and runs of any length can be summarised and
+    compared (and merged) without keeping every duration.
+    """
+    bounds = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5] # upper bound (seconds) of each bucket
+
+    def __init__(self):
+        self.counts = [0] * (len(Histogram.bounds) + 1) # the last bucket is everything above the largest bound
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, duration):
+        self.counts[bisect.bisect_left(Histogram.bounds, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        """
+        :return: count, total and max in seconds, and the bucket counts keyed by their upper bound in ms
+        """
+        return {"count": self.count, "total": round(self.total, 6), "max": round(self.max, 6),
+                "buckets": {f"{bound * 1000:g}" if bound is not None else "inf": count
+                            for bound, count in zip(Histogram.bounds + [None], self.counts) if count > 0}}
+
+class StageTimer:
+    """
+    Times the stages of StateProcess.run. Each timed block (see stage) adds its duration to the histogram of its stage
+    for the current level; at the end of a level these are merged into the histograms of the whole run.
+
+    Stages can be nested: a stage's duration excludes the stages timed inside it (e.g. icons inside circles, or
+    waits inside clicks), so the stages of a level add up to the time spent in them.
+    """
+    stages = ["capture", "origin", "circles", "icons", "lines", "graph", "optimiser", "click", "refresh", "wait"]
+
+    def __init__(self, path=None):
+        """
+        :param path: JSON-lines file to which each level and the run summary are appended (default: not written)
+        """
+        self.path = path
+        self.run = {stage: Histogram() for stage in StageTimer.stages}
+        self.levels = 0
+        self.level = None
+        self.level_start = None
+        self.__children = [] # time spent in nested stages, for each stage currently being timed
+
+    def start_level(self):
+        self.level = {stage: Histogram() for stage in StageTimer.stages}
+        self.level_start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the block inside the with statement as stage name of the current level (if a level has been started).
+        """
+        self.__children.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            children = self.__children.pop()
+            if len(self.__children) > 0:
+                self.__children[-1] += duration
+            if self.level is not None:
+                self.level[name].add(duration - children)
+
+    def level_totals(self):
+        """
+        :return: stage -> seconds spent in it so far in the current level, for the stages timed so far
+        """
+        return {stage: histogram.total for stage, histogram in self.level.items() if histogram.count > 0}
+
+    def end_level(self, **info):
+        """
+        :param info: anything else to record about the level (e.g. its number and origin type)
+        :return: summary of the level (as written to path)
+        """
+        for stage, histogram in self.level.items():
+            self.run[stage].merge(histogram)
+        self.levels += 1
+
+        summary = dict(info, total=round(time.perf_counter() - self.level_start, 6),
+                       stages={stage: histogram.to_dict() for stage, histogram in self.level.items()
+                               if histogram.count > 0})
+        self.level = None
+        self.__write(dict(summary, type="level"))
+        return summary
+
+    def run_summary(self):
+        """
+        :return: summary of every level ended so far
+        """
+        return {"levels": self.levels,
+                "stages": {stage: histogram.to_dict() for stage, histogram in self.run.items()
+                           if histogram.count > 0}}
+
+    def end_run(self):
+        """
+        Ends the current level (if the run stopped partway through one) and records the run summary.
+        """
+        if self.level is not None:
+            self.end_level(cleared=False)
+        self.__write(dict(self.run_summary(), type="run"))
+
+    def __write(self, record):
+        if self.path is not None:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(record) + "\n")
\ No newline at end of file
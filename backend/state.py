@@ -1,22 +1,27 @@
+import cProfile
 import logging
 import sys
 import time
 import traceback
 from datetime import datetime
-from multiprocessing import Process, Pipe
-
-import networkx as nx
-import pyautogui
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import Process, Pipe, Event
+from queue import SimpleQueue
+from threading import Thread
 
 from backend.data import Data
-from backend.node import Node
-from functions import screen_capture, match_origin, vector_circles, match_lines
-from config import Config
+from functions import screen_capture, match_origin, vector_circles, FrameGrabber, edge_image, lines_from_edges
+from config import Config, CompiledProfile
 from debugger import Debugger
+from devices import LiveCapture, LiveInput
+from exceptions import ReplayFinished, RunStopped
 from grapher import Grapher
 from mergedbase import MergedBase
 from optimiser import Optimiser
-from resolution import Resolution
+from outputwriter import OutputWriter
+from stagetimer import StageTimer
+from utils.log_util import CompressedRotatingFileHandler, LogUtil
+from waiter import Waiter
 
 """
 bugs to fix
@@ -34,7 +39,6 @@ immediate priorities
 
 features to add
 - blind mode
-- delete oldest logs once there are more than 100 (allowing retention for greater detail)
 - "you have unsaved changes" next to save button - profiles, settings
 - ability to auto-update software
     - maybe ability to update default config presets as well? may not be desired by people who have overridden
@@ -54,34 +58,61 @@ timeline
 class LoggerWriter(object):
     def __init__(self, writer):
         self._writer = writer
-        self._msg = ""
+        self._parts = [] # of the line not yet ended, only joined once it is
 
     def write(self, message):
-        self._msg = self._msg + message
-        while "\n" in self._msg:
-            pos = self._msg.find("\n")
-            self._writer(self._msg[:pos])
-            self._msg = self._msg[pos + 1:]
+        if "\n" not in message:
+            if message != "":
+                self._parts.append(message)
+            return
+        lines = message.split("\n")
+        self._parts.append(lines[0])
+        self._writer("".join(self._parts))
+        for line in lines[1:-1]:
+            self._writer(line)
+        self._parts = [lines[-1]] if lines[-1] != "" else []
 
     def flush(self):
-        if self._msg != "":
-            self._writer(self._msg)
-            self._msg = ""
+        if len(self._parts) > 0:
+            self._writer("".join(self._parts))
+            self._parts = []
 
 class StateProcess(Process):
-    def __init__(self, pipe: Pipe, args):
+    max_log_runs = 100 # runs to keep the logs of, including this one
+    max_log_bytes = 10 * 1024 * 1024 # size at which a run's log is rotated out and compressed
+    max_log_backups = 4 # rotated logs kept per run
+
+    def __init__(self, pipe: Pipe, args, capture=None, inputs=None):
+        """
+        :param capture: capture backend from devices.py (default: the screen)
+        :param inputs: input backend from devices.py (default: the mouse)
+        """
         Process.__init__(self)
         self.pipe = pipe
         self.args = args
+        self.capture = capture
+        self.inputs = inputs
+        self.stopped = Event() # set by the main process to stop the run at its next wait (see State.terminate)
 
     # send data to main process via pipe
     def emit(self, signal_name, payload=()):
         self.pipe.send((signal_name, payload))
 
+    def emit_timings(self, level, timer: StageTimer):
+        self.emit("timings", (level, timer.run_summary()))
+
     def run(self):
         timestamp = datetime.now()
+        timer = None
+        writer = None
+        listener = None
+        # profile_level: the first level that is not a prestige level is profiled, from capture to the end of the level
+        profiler = None
+        debugger = None
+        grabber = None
+        ending = None # run text to show once this run's logs and output have been written (see finish)
         try:
-            debug, write_to_output, profile_id, character, prestige_limit, bp_limit = self.args
+            debug, write_to_output, profile_level, profile_id, character, prestige_limit, bp_limit = self.args
             log = logging.getLogger()
             log.setLevel(logging.DEBUG)
             log.handlers = []
@@ -89,239 +120,354 @@ class StateProcess(Process):
             stream_handler = logging.StreamHandler()
             stream_handler.setLevel(logging.DEBUG)
             stream_handler.setFormatter(logging.Formatter("%(message)s"))
-            log.addHandler(stream_handler)
 
-            # TODO >= 100 logs, kill until 99
-            file_handler = logging.FileHandler(f"logs/debug-{timestamp.strftime('%y-%m-%d %H-%M-%S')}.log")
+            # older runs' logs are compressed, and only the newest max_log_runs are kept
+            LogUtil.archive("logs", StateProcess.max_log_runs - 1)
+            file_handler = CompressedRotatingFileHandler(f"logs/debug-{timestamp.strftime('%y-%m-%d %H-%M-%S')}.log",
+                                                         StateProcess.max_log_bytes, StateProcess.max_log_backups)
             file_handler.setLevel(logging.DEBUG)
             file_handler.setFormatter(logging.Formatter("%(message)s"))
-            log.addHandler(file_handler)
+
+            # records are only queued here: they are written by the listener's thread, never on the click path
+            queue = SimpleQueue()
+            log.addHandler(QueueHandler(queue))
+            listener = QueueListener(queue, stream_handler, file_handler, respect_handler_level=True)
+            listener.start()
 
             sys.stdout = LoggerWriter(log.debug)
             sys.stderr = LoggerWriter(log.warning)
 
-            pyautogui.FAILSAFE = False
+            # stage timings of each level and of the whole run, as JSON lines
+            timer = StageTimer(f"logs/timings-{timestamp.strftime('%y-%m-%d %H-%M-%S')}.jsonl")
+
+            capture = self.capture if self.capture is not None else LiveCapture()
+            inputs = self.inputs if self.inputs is not None else LiveInput()
 
             prestige_total = 0
             bp_total = 0
             self.emit("prestige", (prestige_total, prestige_limit))
             self.emit("bloodpoint", (bp_total, bp_limit))
 
-            base_res = resolution = Config().resolution()
+            config = Config()
+            base_res = config.resolution()
+            edge_detection = config.edge_detection()
+            if write_to_output:
+                writer = OutputWriter(config.png_compression())
+                writer.start()
             x, y = base_res.top_left()
             cap_dim = base_res.cap_dim()
-
-            ratio = 1
-            if base_res.height != 1080 or base_res.ui_scale != 100:
-                ratio = base_res.height / 1080 * base_res.ui_scale / 100
-                resolution = Resolution(1080 * base_res.width / base_res.height, 1080, 100)
+            resolution, ratio = base_res.normalise()
 
             # initialisation: merged base for template matching
             print(f"initialisation at {base_res.width} x {base_res.height} @ {base_res.ui_scale}; merging")
             print(f"region: ({x}, {y}) to ({x + cap_dim}, {y + cap_dim})")
             unlockables = Data.get_unlockables()
             merged_base = MergedBase(resolution, character)
-            pyautogui.moveTo(0, 0)
+            waiter = Waiter(base_res, ratio, capture, inputs, resolution, timer, self.stopped)
+            inputs.move_to(0, 0)
 
             i = 0
+            origin_type = None # of the previous level, which match_origin tries first
             while True:
+                if self.stopped.is_set():
+                    print("stopped by main process. terminating")
+                    return
+
                 if prestige_limit is not None and prestige_total == prestige_limit:
                     print("reached prestige limit. terminating")
-                    self.emit("terminate")
-                    self.emit("toggle_text", ("Prestige limit reached.", False, False))
+                    ending = ("Prestige limit reached.", False, False)
                     return
 
-                # screen capture
-                print("capturing screen")
-                cv_images = screen_capture(base_res, ratio)
-                debugger = Debugger(cv_images, timestamp, i, write_to_output)
+                capture.start_level()
+                timer.start_level()
+                debugger = Debugger([], timestamp, i, write_to_output, writer)
                 debugger.set_merger(merged_base)
+                if profile_level:
+                    profiler = cProfile.Profile() # only this thread: edges detected in the background are not included
+                    profiler.enable()
+
+                # screen capture: images are analysed as they arrive instead of after all of them are taken -
+                # edges are detected on a worker thread while origin and circles are matched on the first image here
+                print("capturing screen")
+                grabber = FrameGrabber(base_res, ratio, capture,
+                                       on_frame=lambda cv_image: edge_image(cv_image, resolution))
+                grabber.start()
+
+                with timer.stage("capture"):
+                    cv_image, edges_future = grabber.next_frame()
+                    debugger.add_initial_image(cv_image)
+                    edge_futures = [edges_future]
 
                 print("matching origin")
-                origin, origin_type, cropped = match_origin(cv_images[0], resolution)
-                debugger.set_origin(origin)
-                debugger.set_origin_type(origin_type)
-                debugger.set_cropped(cropped)
+                with timer.stage("origin"):
+                    origin, origin_type, cropped = match_origin(cv_image, resolution, origin_type)
+                    debugger.set_origin(origin)
+                    debugger.set_origin_type(origin_type)
+                    debugger.set_cropped(cropped)
                 print(f"matched origin: {origin_type} ({x + origin.x() * ratio}, {y + origin.y() * ratio})")
 
                 # vectors: detect circles and match to unlockables
                 print("vector: circles and match to unlockables")
-                circles = vector_circles(cv_images[0], resolution, origin, merged_base, debugger)
-                debugger.set_valid_circles(circles)
+                with timer.stage("circles"):
+                    circles = vector_circles(cv_image, resolution, origin, merged_base, debugger, timer)
+                    debugger.set_valid_circles(circles)
 
                 # prestige level: proceed to next level
                 if origin_type == "origin_prestige.png" or origin_type == "origin_prestige_small.png":
+                    grabber.stop()
+                    if profiler is not None:
+                        profiler.disable() # profile the next level instead
+                        profiler = None
                     if debug:
                         debugger.show_images()
                     prestige_total += 1
                     bp_total += 20000
                     if bp_limit is not None and bp_total > bp_limit:
                         print("prestige level: reached bloodpoint limit. terminating")
-                        self.emit("terminate")
-                        self.emit("toggle_text", ("Bloodpoint limit reached.", False, False))
+                        ending = ("Bloodpoint limit reached.", False, False)
                         return
 
                     print("prestige level: selecting")
                     self.emit("prestige", (prestige_total, prestige_limit))
                     self.emit("bloodpoint", (bp_total, bp_limit))
-                    pyautogui.moveTo(x + round(origin.x() * ratio), y + round(origin.y() * ratio))
-                    pyautogui.mouseDown()
-                    time.sleep(1.5)
-                    pyautogui.mouseUp()
-                    time.sleep(4) # 4 sec to clear out until new level screen
-                    pyautogui.click()
-                    time.sleep(0.5) # prestige 1-3 => teachables, 4-6 => cosmetics, 7-9 => charms
-                    pyautogui.click()
-                    time.sleep(0.5) # 1 sec to generate
-                    pyautogui.moveTo(0, 0)
-                    time.sleep(0.5) # 1 sec to generate
+                    with timer.stage("click"):
+                        inputs.move_to(x + round(origin.x() * ratio), y + round(origin.y() * ratio))
+                        inputs.mouse_down()
+                        inputs.sleep(1.5)
+                        inputs.mouse_up()
+                        waiter.until(waiter.settled(0.5), 4) # 4 sec to clear out until new level screen
+                        inputs.click()
+                        # prestige 1-3 => teachables, 4-6 => cosmetics, 7-9 => charms
+                        waiter.until(waiter.settled(), 0.5)
+                        inputs.click()
+                        waiter.until(waiter.settled(), 0.5) # 1 sec to generate
+                        inputs.move_to(0, 0)
+                        waiter.until(waiter.origin_present(), 0.5) # 1 sec to generate
+                    self.emit_timings(timer.end_level(level=i, origin_type=origin_type), timer)
                     continue
 
-                # hough transform: detect lines
-                print("hough transform: lines")
-                edge_images, raw_lines, connections = match_lines(cv_images, resolution, circles)
-                debugger.set_edge_images(edge_images)
-                debugger.set_raw_lines(raw_lines)
-                debugger.set_connections(connections)
-
-                # create networkx graph of nodes
-                print("creating networkx graph")
-                grapher = Grapher(circles, connections) # all 9999
-                base_bloodweb = grapher.create()
-                debugger.set_base_bloodweb(base_bloodweb)
+                # remaining images: their edges have been detected in the background while circles were matched
+                with timer.stage("capture"):
+                    for _ in range(1, grabber.iterations):
+                        cv_image, edges_future = grabber.next_frame()
+                        debugger.add_initial_image(cv_image)
+                        edge_futures.append(edges_future)
+
+                # hough transform (or sampling along possible edges): detect lines
+                print(f"{edge_detection} edge detection: lines")
+                with timer.stage("lines"):
+                    edge_images = [future.result() for future in edge_futures]
+                    grabber.stop()
+                    raw_lines, connections = lines_from_edges(edge_images, resolution, circles,
+                                                              edge_detection=edge_detection)
+                    debugger.set_edge_images(edge_images)
+                    debugger.set_raw_lines(raw_lines)
+                    debugger.set_connections(connections)
+                print(f"analysed in {time.perf_counter() - timer.level_start:.3f}s: " +
+                      ", ".join(f"{stage} {duration:.3f}s" for stage, duration in timer.level_totals().items()))
+
+                # create graph of nodes
+                print("creating bloodweb graph")
+                with timer.stage("graph"):
+                    grapher = Grapher(circles, connections) # all 9999
+                    base_bloodweb = grapher.create()
+                    debugger.set_base_bloodweb(base_bloodweb)
+                node_ids = base_bloodweb.node_ids
                 print("NODES")
-                for node in base_bloodweb.nodes:
-                    print(f"    {node}")
+                for node_id in node_ids:
+                    print(f"    {node_id}")
                 print("EDGES")
-                max_len = max([str_len for edge in base_bloodweb.edges for str_len in [len(edge[0]), len(edge[1])]])
-                for edge in base_bloodweb.edges:
-                    print(f"    {str(edge[0]).ljust(max_len, ' ')} {edge[1]}")
+                max_len = max([len(node_id) for node_id in node_ids])
+                for slot1, slot2 in base_bloodweb.edges():
+                    print(f"    {node_ids[slot1].ljust(max_len, ' ')} {node_ids[slot2]}")
 
                 if debug:
                     debugger.show_images()
 
+                # preferences are compiled once and reused until config.json is modified
+                profile = CompiledProfile.get(profile_id)
+
                 # fast-forward levels with <= 6 nodes (excl. origin) and none yet claimed
-                fast = len(base_bloodweb.nodes) <= 7 and all([not data["is_user_claimed"]
-                                                              for node_id, data in base_bloodweb.nodes.items()
-                                                              if node_id != "ORIGIN"])
+                fast = len(base_bloodweb) <= 7 and not any([base_bloodweb.is_user_claimed[slot]
+                                                            for slot, node_id in enumerate(node_ids)
+                                                            if node_id != "ORIGIN"])
+                previous_image = cv_image # only nodes that change between images are checked again
                 j = 1
                 run = True
                 while run:
+                    if self.stopped.is_set():
+                        print("stopped by main process. terminating")
+                        return
+
                     # correct reachable nodes
                     # print("pre-correction")
-                    # for node_id, data in base_bloodweb.nodes.items():
-                    #     if any([base_bloodweb.nodes[neighbour]["is_user_claimed"] for neighbour in
-                    #             base_bloodweb.neighbors(node_id)]) and not data["is_accessible"]:
-                    #         print(f"    corrected {node_id}")
-                    #         nx.set_node_attributes(base_bloodweb, Node.from_dict(data, is_accessible=True).get_dict())
+                    # for slot in base_bloodweb.correct_accessibility():
+                    #     print(f"    corrected {node_ids[slot]}")
 
                     # run through optimiser
                     print("optimiser")
-                    optimiser = Optimiser(base_bloodweb)
-                    optimiser.run(profile_id)
+                    with timer.stage("optimiser"):
+                        optimiser = Optimiser(base_bloodweb)
+                        optimiser.run(profile)
+                        optimal_unlockable = optimiser.select_best()
                     print("    updated nodes")
-                    for node_id, data in optimiser.dijkstra_graph.nodes.items():
-                        print(f"        {node_id.ljust(max_len, ' ')} "
-                              f"value {str(data['value']).ljust(10, ' ')} "
-                              f"accessible {str(data['is_accessible']).ljust(5, ' ')} "
-                              f"claimed {data['is_user_claimed']}")
-
-                    optimal_unlockable = optimiser.select_best()
+                    dijkstra_bloodweb = optimiser.dijkstra_graph
+                    for slot in dijkstra_bloodweb.present():
+                        print(f"        {node_ids[slot].ljust(max_len, ' ')} "
+                              f"value {str(dijkstra_bloodweb.value[slot]).ljust(10, ' ')} "
+                              f"accessible {str(dijkstra_bloodweb.is_accessible[slot]).ljust(5, ' ')} "
+                              f"claimed {dijkstra_bloodweb.is_user_claimed[slot]}")
+
+                    optimal_slot = base_bloodweb.index[optimal_unlockable.node_id]
                     selected_unlockable = [u for u in unlockables if u.unique_id == optimal_unlockable.name][0]
                     bp_total += Data.get_cost(selected_unlockable.rarity)
                     if bp_limit is not None and bp_total > bp_limit:
                         print(f"{optimal_unlockable.node_id}: reached bloodpoint limit. terminating")
-                        self.emit("terminate")
-                        self.emit("toggle_text", ("Bloodpoint limit reached.", False, False))
+                        ending = ("Bloodpoint limit reached.", False, False)
                         return
 
                     print(optimal_unlockable.node_id)
                     debugger.set_dijkstra(optimiser.dijkstra_graph, j)
                     self.emit("bloodpoint", (bp_total, bp_limit))
                     if fast:
-                        optimal_unlockable.set_user_claimed(True)
-                        optimal_unlockable.set_value(9999)
-                        nx.set_node_attributes(base_bloodweb, optimal_unlockable.get_dict())
-
-                    # select perk: hold on the perk for 0.3s
-                    pyautogui.moveTo(x + round(optimal_unlockable.x * ratio), y + round(optimal_unlockable.y * ratio))
-                    pyautogui.mouseDown()
-                    time.sleep(0.15)
-                    pyautogui.moveTo(0, 0)
-                    time.sleep(0.15)
-                    pyautogui.mouseUp()
-
-                    # mystery box: click
-                    if "mysteryBox" in optimal_unlockable.name:
-                        print("mystery box selected")
-                        time.sleep(0.9)
-                        pyautogui.click()
-                        time.sleep(0.2)
-
-                    # move mouse again in case it didn't the first time
-                    pyautogui.moveTo(0, 0)
-
-                    if fast:
-                        # correct reachable nodes
-                        print("post-correction")
-                        for node_id, data in base_bloodweb.nodes.items():
-                            if any([base_bloodweb.nodes[neighbour]["is_user_claimed"] for neighbour in
-                                    base_bloodweb.neighbors(node_id)]) and not data["is_accessible"]:
-                                print(f"    corrected {node_id}")
-                                nx.set_node_attributes(base_bloodweb, Node.from_dict(data, is_accessible=True).get_dict())
-                    else:
-                        # time for bloodweb to update
-                        time.sleep(0.3)
-
-                        # take new picture and update colours
-                        print("updating bloodweb")
-                        updated_image = screen_capture(base_res, ratio, 1)[0]
-                        Grapher.update(base_bloodweb, updated_image, resolution)
-                        debugger.add_updated_image(updated_image.get_bgr(), j)
+                        base_bloodweb.claim(optimal_slot)
+
+                    # select perk: hold on the perk until it is claimed (at most 0.3s)
+                    with timer.stage("click"):
+                        inputs.move_to(x + round(optimal_unlockable.x * ratio),
+                                       y + round(optimal_unlockable.y * ratio))
+                        inputs.mouse_down()
+                        waiter.until(waiter.node_claimed(optimal_unlockable.x, optimal_unlockable.y), 0.3)
+                        inputs.move_to(0, 0)
+                        inputs.mouse_up()
+
+                        # mystery box: click
+                        if "mysteryBox" in optimal_unlockable.name:
+                            print("mystery box selected")
+                            waiter.until(waiter.settled(0.2), 0.9)
+                            inputs.click()
+                            waiter.until(waiter.settled(), 0.2)
+
+                        # move mouse again in case it didn't the first time
+                        inputs.move_to(0, 0)
+
+                    with timer.stage("refresh"):
+                        if fast:
+                            # correct reachable nodes
+                            print("post-correction")
+                            for slot in base_bloodweb.correct_accessibility():
+                                print(f"    corrected {node_ids[slot]}")
+                        else:
+                            # time for bloodweb to update
+                            waiter.until(waiter.node_settled(optimal_unlockable.x, optimal_unlockable.y), 0.3)
+
+                            # take new picture and update colours
+                            print("updating bloodweb")
+                            updated_image = screen_capture(base_res, ratio, capture, 1)[0]
+                            checked = Grapher.update(base_bloodweb, updated_image, resolution, previous_image,
+                                                     optimal_slot)
+                            print(f"    checked {len(checked)} changed nodes")
+                            debugger.add_updated_image(updated_image.get_bgr(), j)
+                            previous_image = updated_image
 
                     # new level
-                    optimiser_test = Optimiser(base_bloodweb)
-                    optimiser_test.run(profile_id)
-                    optimal_test = optimiser_test.select_best()
-                    num_left = sum([1 for data in base_bloodweb.nodes.values() if not data["is_user_claimed"]])
+                    with timer.stage("optimiser"):
+                        optimiser_test = Optimiser(base_bloodweb)
+                        optimiser_test.run(profile)
+                        optimal_test = optimiser_test.select_best()
+                    num_left = len(base_bloodweb.unclaimed())
                     if optimal_test.node_id == "ORIGIN" or num_left == 0:
                         # TODO verify that .node_id == "ORIGIN" will still happen if >1 item gets chomped by entity on last click
                         print("level cleared")
                         run = False
-                        time.sleep(0.5) # 2 sec to clear out until new level screen
-                        pyautogui.click()
-                        time.sleep(0.5) # in case of extra information on early level (eg. lvl 2 or lvl 5)
-                        pyautogui.click()
-                        time.sleep(0.5) # in case of yet more extra information on early level (eg. lvl 10)
-                        pyautogui.click()
-                        time.sleep(2) # 2 secs to generate
+                        with timer.stage("click"):
+                            waiter.until(waiter.settled(), 0.5) # 2 sec to clear out until new level screen
+                            inputs.click()
+                            # in case of extra information on early level (eg. lvl 2 or lvl 5)
+                            waiter.until(waiter.settled(), 0.5)
+                            inputs.click()
+                            # in case of yet more extra information on early level (eg. lvl 10)
+                            waiter.until(waiter.settled(), 0.5)
+                            inputs.click()
+                            waiter.until(waiter.generated(), 2) # 2 secs to generate
+                        if profiler is not None:
+                            profiler.disable()
+                            debugger.set_profile(profiler)
+                            profiler = None
+                            profile_level = False
+                        self.emit_timings(timer.end_level(level=i, origin_type=origin_type, nodes=j), timer)
                     j += 1
                 i += 1
+        except RunStopped as e:
+            print(e.message)
+            inputs.mouse_up() # in case it was stopped while holding a node
+        except ReplayFinished as e:
+            print(e.message)
+            ending = ("Replay finished.", False, False)
         except:
             traceback.print_exc()
+            ending = (f"An error occurred. Please check "
+                      f"debug-{timestamp.strftime('%y-%m-%d %H-%M-%S')}.log for additional details.", True, False)
+        finally:
+            if grabber is not None:
+                grabber.stop() # in case the level ended before it was stopped
+            self.finish(timer, profiler, debugger, writer, listener, ending)
+
+    def finish(self, timer, profiler, debugger, writer, listener, ending):
+        """
+        Writes out everything the run has recorded, and only then tells the main process that the run has ended (as it
+        may terminate this process straight away).
+
+        :param profiler: the profiler of the level being profiled, if the run ended before that level cleared
+        :param ending: (text, is_error, hide) to show, or None if the run was stopped by the main process
+        """
+        if timer is not None:
+            timer.end_run()
+        if profiler is not None:
+            profiler.disable()
+            debugger.set_profile(profiler) # of the level up to where the run ended (e.g. at the bloodpoint limit)
+        if writer is not None:
+            writer.stop()
+        if listener is not None:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            listener.stop() # writes out the rest of the queue
+        if ending is not None:
             self.emit("terminate")
-            self.emit("toggle_text", (f"An error occurred. Please check "
-                                      f"debug-{timestamp.strftime('%y-%m-%d %H-%M-%S')}.log for additional details.",
-                                      True, False))
+            self.emit("toggle_text", ending)
 
 class State:
     version = "v0.3.3"
+    stop_timeout = 3 # seconds to wait for a terminated run to stop and write what it has recorded
 
     def __init__(self, pipe):
         self.process = None
         self.pipe = pipe
+        self.stopping = None # thread waiting for the last terminated run to stop
 
     def is_active(self):
         return self.process is not None
 
     def run(self, args):
         if not self.is_active():
+            if self.stopping is not None:
+                self.stopping.join() # the last run must not be clicking alongside this one
             self.process = StateProcess(self.pipe, args)
             self.process.start()
             print("process started without debugging")
 
     def terminate(self):
         if self.is_active():
-            self.process.terminate()
+            # let the run stop at its next wait and write what it has recorded, before forcing it to stop - waited for
+            # on another thread, so that the window does not freeze meanwhile
+            self.process.stopped.set()
+            self.stopping = Thread(target=State.__stop, args=(self.process,), daemon=True)
+            self.stopping.start()
             self.process = None
-            print("process terminated")
\ No newline at end of file
+            print("process terminated")
+
+    @staticmethod
+    def __stop(process):
+        process.join(State.stop_timeout)
+        if process.is_alive():
+            process.terminate()
\ No newline at end of file
@@ -6,9 +6,18 @@ from backend.utils.color_util import ColorUtil
 
 
 class ImageUtil:
+    colors = ["taupe", "red", "neutral", "black"]
+    color_lut_bits = 5 # per channel: 32768 quantised colours
+    histogram_bits = 4 # per channel, for finding the most common colours
+    n_colors = 5 # most common colours to try
+    __color_lut = None
+    __annulus_masks = {} # radius -> mask, see annulus_mask
+
     @staticmethod
     def cut_circle(image, centre, radius):
         """
+        Cuts out the ring between radius and the full radius of a node around centre: only the square around the ring
+        is copied, and everything in it but the ring (from annulus_mask) is made white.
 
         Args:
             image: 3 layer bgr image
@@ -19,62 +28,111 @@ class ImageUtil:
 
         """
         height, width, _ = image.shape
-        masked_data = image.copy()
-
-        # white mask with black center to remove perk information in the centre
-        mask = np.zeros((height, width), np.uint8)
-        color = 255
-        mask[:] = color
-        cv2.circle(mask, centre, radius, (0, 0, 0), thickness=-1)
-        masked_data[mask == 0] = (255, 255, 255)
-
-        # black mask with white center to remove everything outside
-        full_radius = radius + round(Resolution.additional_radius(radius) * 5 / 6)
-        mask = np.zeros((height, width), np.uint8)
-        cv2.circle(mask, centre, full_radius, (255, 255, 255), thickness=-1)
-        masked_data[mask == 0] = (255, 255, 255)
+        full_radius = ImageUtil.full_radius(radius)
 
         x, y = centre
-        unlockable = masked_data[max(y-full_radius, 0):min(y+full_radius, height),
-                                 max(x-full_radius, 0):min(x+full_radius, width)]
-        unlockable = cv2.cvtColor(unlockable, cv2.COLOR_BGRA2BGR)
+        top, bottom = max(y - full_radius, 0), min(y + full_radius, height)
+        left, right = max(x - full_radius, 0), min(x + full_radius, width)
+        if bottom <= top or right <= left:
+            return np.empty((0, 0, 3), image.dtype)
+
+        unlockable = image[top:bottom, left:right].copy()
+        # the square of the mask around (full_radius, full_radius) that is in the image
+        mask = ImageUtil.annulus_mask(radius)[top - (y - full_radius):bottom - (y - full_radius),
+                                              left - (x - full_radius):right - (x - full_radius)]
+        unlockable[~mask] = (255, 255, 255)
 
-        # cv2.imshow("masked", masked_data)
         # cv2.imshow("color", unlockable)
 
         return unlockable
 
+    @staticmethod
+    def full_radius(radius):
+        """
+        :return: the outer radius of the ring cut_circle keeps around a node of radius
+        """
+        return radius + round(Resolution.additional_radius(radius) * 5 / 6)
+
+    @staticmethod
+    def annulus_mask(radius):
+        """
+        :return: (read-only) boolean mask of the ring cut_circle keeps - the pixels a full_radius circle would fill
+                 that a radius circle would not - in a (2 * full radius) square crop centred on it. Each is only drawn
+                 the first time it is needed.
+        """
+        if radius not in ImageUtil.__annulus_masks:
+            full_radius = ImageUtil.full_radius(radius)
+            mask = np.zeros((2 * full_radius, 2 * full_radius), np.uint8)
+            cv2.circle(mask, (full_radius, full_radius), full_radius, 255, thickness=-1)
+            cv2.circle(mask, (full_radius, full_radius), radius, 0, thickness=-1)
+            mask = mask > 0
+            mask.setflags(write=False)
+            ImageUtil.__annulus_masks[radius] = mask
+        return ImageUtil.__annulus_masks[radius]
+
     @staticmethod
     def dominant_color(image):
-        pixels = np.float32(image.reshape(-1, 3))
+        """
+        Finds the most common colours in the image like k-means would (largest first, ignoring the white mask from
+        cut_circle), but deterministically: each is the mean of the pixels around the fullest bin of a coarse 3-D
+        histogram. Returns the closest_color of the first of them that is close to any, looked up in color_lut.
 
-        n_colors = 5
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 200, .1)
-        flags = cv2.KMEANS_RANDOM_CENTERS
+        Args:
+            image: BGR image, e.g. from cut_circle
 
-        _, labels, palette = cv2.kmeans(pixels, n_colors, None, criteria, 10, flags)
-        _, counts = np.unique(labels, return_counts=True)
+        Returns: "taupe", "red", "neutral", "black" or None
 
-        freqs = []
-        for i in range(n_colors):
-            freqs.append((palette[i].astype(np.int), counts[i]))
+        """
+        pixels = image.reshape(-1, 3)
+        pixels = pixels[(pixels != 255).any(axis=1)] # ignore white
+        coarse = (pixels >> (8 - ImageUtil.histogram_bits)).astype(np.intp)
 
-        freqs.sort(key=lambda pair: pair[1], reverse=True)
+        n = 1 << ImageUtil.histogram_bits
+        for _ in range(ImageUtil.n_colors):
+            if len(pixels) == 0:
+                break
 
-        for color, _ in freqs:
-            if sum(color) == 765: # white
-                continue
+            # the pixels in and around the fullest bin
+            peak = np.bincount((coarse[:, 0] * n + coarse[:, 1]) * n + coarse[:, 2], minlength=n ** 3).argmax()
+            near = (np.abs(coarse - np.unravel_index(peak, (n, n, n))) <= 1).all(axis=1)
 
-            # display = np.zeros((100, 100, 3), np.uint8)
-            # display[:] = tuple(color)
-            # cv2.imshow("matched color", display)
+            color = ImageUtil.__lut_index(pixels[near].mean(axis=0).round().astype(np.intp))
+            if ImageUtil.color_lut()[color] < len(ImageUtil.colors):
+                return ImageUtil.colors[ImageUtil.color_lut()[color]]
 
-            closest = ImageUtil.closest_color(tuple(color)[::-1]) # bgr -> rgb
-            if closest is not None:
-                return closest
+            # didn't match any: try the next most common
+            pixels, coarse = pixels[~near], coarse[~near]
 
         return None
 
+    @staticmethod
+    def __lut_index(bgr):
+        bits = ImageUtil.color_lut_bits
+        b, g, r = np.asarray(bgr) >> (8 - bits)
+        return (b << (2 * bits)) | (g << bits) | r
+
+    @staticmethod
+    def color_lut():
+        """
+        Returns: for each quantised BGR colour (b, g, r each color_lut_bits bits, as b << 2 * bits | g << bits | r), the
+                 index in colors of its closest_color, or len(colors) if it didn't match any
+
+        """
+        if ImageUtil.__color_lut is None:
+            n = 1 << ImageUtil.color_lut_bits
+            step = 256 // n
+            lut = np.empty(n ** 3, np.uint8)
+            for b in range(n):
+                for g in range(n):
+                    for r in range(n):
+                        # the centre of each bin
+                        closest = ImageUtil.closest_color((r * step + step // 2, g * step + step // 2,
+                                                           b * step + step // 2))
+                        lut[(b * n + g) * n + r] = ImageUtil.colors.index(closest) if closest is not None \
+                            else len(ImageUtil.colors)
+            ImageUtil.__color_lut = lut
+        return ImageUtil.__color_lut
+
     @staticmethod
     def closest_color(color):
         taupe_delta = ColorUtil.diff(ColorUtil.taupe_rgb, color)
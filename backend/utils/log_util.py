@@ -0,0 +1,50 @@
+import gzip
+import os
+import re
+import shutil
+from logging.handlers import RotatingFileHandler
+
+
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    """
+    A RotatingFileHandler which gzips each file it rotates out: debug.log is rolled over to debug.log.1.gz, and so on
+    up to backupCount, after which the oldest is deleted.
+    """
+    def __init__(self, filename, max_bytes, backup_count):
+        RotatingFileHandler.__init__(self, filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = LogUtil.compress
+
+class LogUtil:
+    run_pattern = re.compile(r"(?:debug|timings)-(.+?)\.(?:log|jsonl)(?:\.\d+)?(?:\.gz)?") # files of each run
+
+    @staticmethod
+    def compress(source, dest):
+        with open(source, "rb") as file_in, gzip.open(dest, "wb") as file_out:
+            shutil.copyfileobj(file_in, file_out)
+        os.remove(source)
+
+    @staticmethod
+    def archive(directory, keep):
+        """
+        Deletes all but the logs of the newest keep runs in directory, then gzips the remaining logs that are not yet
+        compressed. Only call before the current run's logs are opened.
+
+        :param keep: number of runs (by the timestamp in their file names) to keep the logs of
+        """
+        runs = {}
+        for file in os.listdir(directory):
+            match = LogUtil.run_pattern.fullmatch(file)
+            if match:
+                runs.setdefault(match.group(1), []).append(file)
+
+        timestamps = sorted(runs) # "%y-%m-%d %H-%M-%S" sorts in the order the runs were started
+        for timestamp in timestamps[:max(len(timestamps) - keep, 0)]:
+            for file in runs.pop(timestamp):
+                os.remove(os.path.join(directory, file))
+
+        for files in runs.values():
+            for file in files:
+                if not file.endswith(".gz"):
+                    path = os.path.join(directory, file)
+                    LogUtil.compress(path, f"{path}.gz")
\ No newline at end of file
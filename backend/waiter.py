@@ -0,0 +1,175 @@
+import time
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+from backend.matcher import Matcher # the same module as functions, so that the origin templates are shared
+from exceptions import RunStopped
+from image import Image
+from resolutionprofile import ResolutionProfile
+from shapes import Position
+
+"""
+Waits for the game to respond to inputs by polling small regions of the screen, instead of sleeping for fixed times.
+Each wait returns as soon as its condition is seen, or after its timeout (the time that used to be slept) at the latest,
+so that a condition that is never seen behaves as the old sleep did.
+"""
+
+class Waiter:
+    interval = 0.02 # seconds between polls
+    settled_threshold = 1.5 # mean grey level difference between polls, below which the bloodweb has stopped moving
+    origin_threshold = 0.8 # TM_CCOEFF_NORMED score for an origin to be present
+
+    def __init__(self, base_res, ratio, capture, inputs, res, timer=None, stopped=None):
+        """
+        :param base_res: the base display resolution
+        :param ratio: the factor by which images are downscaled from base_res to res (as in grab_frame)
+        :param res: the resolution of the downscaled images, which node positions are in
+        :param timer: StageTimer to time each wait with (as stage wait), if any
+        :param stopped: Event which, once set, ends the wait in progress (or the next one) by raising RunStopped
+        """
+        self.base_res = base_res
+        self.ratio = ratio
+        self.capture = capture
+        self.inputs = inputs
+        self.res = res
+        self.timer = timer
+        self.stopped = stopped
+        self.profile = ResolutionProfile.get(res)
+
+        self.origin_templates = Matcher.origin_templates(res)
+
+    def until(self, condition, timeout):
+        """
+        :param condition: function returning whether what is being waited for has happened
+        :param timeout: seconds after which to stop waiting
+        :return: whether the condition was seen before the timeout
+        :raises RunStopped: if stopped is set before or during the wait
+        """
+        with self.timer.stage("wait") if self.timer is not None else nullcontext():
+            return self.__until(condition, timeout)
+
+    def __until(self, condition, timeout):
+        self.__check_stopped()
+        if not self.capture.realtime:
+            # images that are not taken live never change: wait as long as before (or not at all, if inputs don't)
+            self.inputs.sleep(timeout)
+            return False
+
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                print(f"waited {timeout}s without {condition.__name__}")
+                return False
+            if self.stopped is not None:
+                self.stopped.wait(min(Waiter.interval, remaining)) # returns as soon as it is set
+                self.__check_stopped()
+            else:
+                time.sleep(min(Waiter.interval, remaining))
+        return True
+
+    def __check_stopped(self):
+        if self.stopped is not None and self.stopped.is_set():
+            raise RunStopped("stopped by main process. terminating")
+
+    def __grab(self, x, y, radius):
+        """
+        :param x, y: centre of the region at res
+        :return: BGR image of the square of radius around (x, y) at res
+        """
+        left, top = self.base_res.top_left()
+        size = round(2 * radius * self.ratio)
+        image = self.capture.screenshot((left + round((x - radius) * self.ratio),
+                                         top + round((y - radius) * self.ratio), size, size))
+        if self.ratio != 1:
+            image = cv2.resize(image, (2 * radius, 2 * radius), interpolation=Image.interpolation)
+        return image
+
+    def node_claimed(self, x, y):
+        """
+        :param x, y: centre of the node at res
+        :return: condition: the node is claimed, as Matcher.get_circle_properties tells claimed nodes apart - the
+                 large node is gone and a red small node is left. The red progress ring drawn while the node is held
+                 is around the large node, which is still there, so it doesn't count
+        """
+        ur = self.profile.unlockable_radius
+        centre = Position(ur, ur)
+
+        def node_claimed():
+            image = self.__grab(x, y, ur)
+            square = Matcher.filter_squares(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), [centre], self.res)[0]
+            _, _, unique_id = Matcher.get_circle_properties(image, square, centre, self.res)
+            return unique_id == "CLAIMED"
+        return node_claimed
+
+    def __centre_radius(self):
+        """
+        :return: half the side of the square in the centre of the bloodweb that match_origin searches
+        """
+        crop_ratio = 2.6
+        return round(self.res.cap_dim() * (0.5 - 1 / crop_ratio))
+
+    def origin_present(self):
+        """
+        :return: condition: an origin is in the centre of the bloodweb (the same region as match_origin searches)
+        """
+        cap_dim = self.res.cap_dim()
+        radius = self.__centre_radius()
+
+        def origin_present():
+            image = self.__grab(cap_dim // 2, cap_dim // 2, radius)[:, :, 2] # red, as in match_origin
+            for _, template, template_alpha, *_ in self.origin_templates:
+                result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, mask=template_alpha)
+                result[~np.isfinite(result)] = -1 # masked matching divides by zero on flat regions
+                if result.max() >= Waiter.origin_threshold:
+                    return True
+            return False
+        return origin_present
+
+    def settled(self, duration=0.1, x=None, y=None, radius=None):
+        """
+        :param duration: seconds for which the bloodweb must not have moved
+        :param x, y, radius: centre (at res) and half the side of the square which is polled (default: the centre of
+                             the bloodweb, the same region as origin_present)
+        :return: condition: the square has changed since the wait began, and has since stopped moving (e.g. after the
+                 entity consumes nodes, or a new level finishes generating). A screen which has not started to change
+                 yet is not settled: if no change is ever seen, the wait lasts its whole timeout
+        """
+        if radius is None:
+            cap_dim = self.res.cap_dim()
+            x, y, radius = cap_dim // 2, cap_dim // 2, self.__centre_radius()
+        state = {"previous": None, "since": None}
+
+        def settled():
+            image = cv2.cvtColor(self.__grab(x, y, radius), cv2.COLOR_BGR2GRAY)
+            image = cv2.resize(image, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA) # ignore small noise
+            now = time.perf_counter()
+            if state["previous"] is not None and \
+                    cv2.absdiff(image, state["previous"]).mean() > Waiter.settled_threshold:
+                state["since"] = now
+            state["previous"] = image
+            return state["since"] is not None and now - state["since"] >= duration
+        return settled
+
+    def node_settled(self, x, y, duration=0.1):
+        """
+        :param x, y: centre of the node at res
+        :return: condition: settled, polling the node and the nodes around it (e.g. after it is claimed, as the nodes
+                 joined to it become accessible and the entity consumes nodes)
+        """
+        return self.settled(duration, x, y, 3 * self.profile.unlockable_radius)
+
+    def generated(self):
+        """
+        :return: condition: a new level has finished generating - it has settled after changing (so the old level's
+                 origin, which is there until the new level appears, is not taken for the new one) and its origin is
+                 there
+        """
+        settled = self.settled(0.3)
+        origin_present = self.origin_present()
+
+        def generated():
+            return settled() and origin_present()
+        return generated
\ No newline at end of file
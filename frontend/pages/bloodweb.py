@@ -48,6 +48,16 @@ class BloodwebPage(QWidget):
         self.runBloodpointProgress.setText(f"Bloodpoints spent: {bp_total:,} / {bp_limit:,}"
                                            if bp_limit is not None else "")
 
+    def on_timings_signal(self, level, run):
+        # the slowest stages of the last level, and the mean level time of the run
+        if not self.dev_mode:
+            return
+        stages = sorted(level["stages"].items(), key=lambda stage: stage[1]["total"], reverse=True)[:3]
+        run_total = sum(stage["total"] for stage in run["stages"].values())
+        self.runTimings.setText(f"Last level: {level['total']:.2f}s ("
+                                + ", ".join(f"{name} {stage['total']:.2f}s" for name, stage in stages)
+                                + f"); mean over {run['levels']} levels: {run_total / run['levels']:.2f}s")
+
     def show_run_success(self, text, hide):
         self.runErrorText.setText(text)
         self.runErrorText.setStyleSheet(StyleSheets.pink_text)
@@ -66,8 +76,8 @@ class BloodwebPage(QWidget):
         self.runErrorText.setVisible(False)
 
     def get_run_mode(self):
-        return (self.devDebugCheckBox.isChecked(), self.devOutputCheckBox.isChecked()) \
-            if self.dev_mode else (False, False)
+        return (self.devDebugCheckBox.isChecked(), self.devOutputCheckBox.isChecked(),
+                self.devProfileCheckBox.isChecked()) if self.dev_mode else (False, False, False)
 
     def __init__(self, dev_mode):
         super().__init__()
@@ -135,12 +145,23 @@ class BloodwebPage(QWidget):
             self.devOutputCheckBox = CheckBox(self, "bloodwebPageDevOutputCheckBox")
             self.devOutputLabel = TextLabel(self, "bloodwebPageDevOutputLabel", "Write Output to Folder", Font(10))
 
+            self.devProfileRow = QWidget(self)
+            self.devProfileRow.setObjectName("bloodwebPageDevProfileRow")
+            self.devProfileRowLayout = RowLayout(self.devProfileRow, "bloodwebPageDevProfileRowLayout")
+            self.devProfileCheckBox = CheckBox(self, "bloodwebPageDevProfileCheckBox")
+            self.devProfileLabel = TextLabel(self, "bloodwebPageDevProfileLabel", "Profile One Level", Font(10))
+
             self.devDebugRowLayout.addWidget(self.devDebugCheckBox)
             self.devDebugRowLayout.addWidget(self.devDebugLabel)
             self.devDebugRowLayout.addStretch(1)
             self.devOutputRowLayout.addWidget(self.devOutputCheckBox)
             self.devOutputRowLayout.addWidget(self.devOutputLabel)
             self.devOutputRowLayout.addStretch(1)
+            self.devProfileRowLayout.addWidget(self.devProfileCheckBox)
+            self.devProfileRowLayout.addWidget(self.devProfileLabel)
+            self.devProfileRowLayout.addStretch(1)
+
+            self.runTimings = TextLabel(self, "bloodwebPageRunTimings", "", Font(10))
 
         self.runLabel = TextLabel(self, "bloodwebPageRunLabel", "Run", Font(12))
         self.runDescription = TextLabel(self, "bloodwebPageRunLabel",
@@ -186,9 +207,12 @@ class BloodwebPage(QWidget):
             self.layout.addWidget(self.devLabel)
             self.layout.addWidget(self.devDebugRow)
             self.layout.addWidget(self.devOutputRow)
+            self.layout.addWidget(self.devProfileRow)
         self.layout.addWidget(self.runLabel)
         self.layout.addWidget(self.runDescription)
         self.layout.addWidget(self.runRow)
         self.layout.addWidget(self.runPrestigeProgress)
         self.layout.addWidget(self.runBloodpointProgress)
+        if dev_mode:
+            self.layout.addWidget(self.runTimings)
         self.layout.addStretch(1)
\ No newline at end of file
@@ -236,9 +236,9 @@ class PreferencesPage(QWidget):
     def switch_edit_profile(self):
         if not self.ignore_profile_signals:
             # TODO prompt: unsaved changes (save or discard)
-            config = Config()
+            profile = Config().compile_profile(self.get_edit_profile())
             for widget in self.unlockableWidgets:
-                widget.setTiers(*config.preference(widget.unlockable.unique_id, self.get_edit_profile()))
+                widget.setTiers(*profile.preference(widget.unlockable.unique_id))
 
     def save_profile(self):
         profile_id = self.get_edit_profile()
@@ -546,8 +546,9 @@ class PreferencesPage(QWidget):
         self.lastSortedBy = "name" # cache of last sort
 
         # all unlockables
+        profile = config.compile_profile(self.get_edit_profile())
         self.unlockableWidgets = [UnlockableWidget(self.scrollAreaContent, unlockable,
-                                                   *config.preference(unlockable.unique_id, self.get_edit_profile()),
+                                                   *profile.preference(unlockable.unique_id),
                                                    self.on_unlockable_select)
                                   for unlockable in Data.get_unlockables()
                                   if unlockable.category not in ["unused", "retired"]]
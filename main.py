@@ -321,7 +321,7 @@ class MainWindow(QMainWindow):
         return self.bloodwebPage.bloodpointInput.text() if self.bloodwebPage.bloodpointCheckBox.isChecked() else None
 
     def run_terminate(self):
-        debug, write_to_output = self.bloodwebPage.get_run_mode()
+        debug, write_to_output, profile_level = self.bloodwebPage.get_run_mode()
         if not self.state.is_active(): # run
             # check prestige limit
             prestige_limit = self.get_runtime_prestige_limit()
@@ -342,8 +342,8 @@ class MainWindow(QMainWindow):
                 if not (1 <= bp_limit):
                     return self.bloodwebPage.show_run_error("Bloodpoint limit must be a positive integer.", True)
 
-            self.state.run((debug, write_to_output, self.get_runtime_profile(), self.get_runtime_character(),
-                            prestige_limit, bp_limit))
+            self.state.run((debug, write_to_output, profile_level, self.get_runtime_profile(),
+                            self.get_runtime_character(), prestige_limit, bp_limit))
             self.toggle_run_terminate_text("Running...", False, True)
         else: # terminate
             self.state.terminate()
@@ -765,6 +765,7 @@ class MainWindow(QMainWindow):
 
         self.emitter.prestige.connect(self.bloodwebPage.on_prestige_signal)
         self.emitter.bloodpoint.connect(self.bloodwebPage.on_bloodpoint_signal)
+        self.emitter.timings.connect(self.bloodwebPage.on_timings_signal)
         self.emitter.terminate.connect(self.state.terminate)
         self.emitter.toggle_text.connect(self.toggle_run_terminate_text)
 
@@ -778,6 +779,7 @@ class Emitter(QObject, Thread):
     bloodpoint = pyqtSignal(int, object) # total, limit
     terminate = pyqtSignal()
     toggle_text = pyqtSignal(str, bool, bool) # message, is error, hide
+    timings = pyqtSignal(object, object) # level, run (see StageTimer)
 
     def __init__(self, pipe):
         QObject.__init__(self)
@@ -791,6 +793,7 @@ class Emitter(QObject, Thread):
             "bloodpoint": lambda: self.bloodpoint.emit(*args),
             "terminate": lambda: self.terminate.emit(*args),
             "toggle_text": lambda: self.toggle_text.emit(*args),
+            "timings": lambda: self.timings.emit(*args),
         }[signature]()
 
     def run(self):